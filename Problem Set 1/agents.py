@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
-from typing import Callable, Dict, Generic, List
+from typing import Callable, Dict, Generic, List, Optional
 from problem import HeuristicFunction, Problem, S, A, Solution
+from solution_store import SolutionStore, describe
 
 # This is an abstract class for all goal based agents
 class GoalBasedAgent(ABC, Generic[S, A]):
@@ -22,17 +23,23 @@ class HumanAgent(GoalBasedAgent[S, A]):
         return self.user_input_fn(problem, state)
 
 # This agent applies an uninformed search algorithm to find the solution to goal for the given state
+# If a solution store is given, the solutions are read from (and written to) the store so they persist across runs
+# The config describes the search in the store keys (by default, it is the description of the search function, see "describe")
 class UninformedSearchAgent(GoalBasedAgent[S, A]):
-    def __init__(self, search_fn: Callable[[Problem[S, A], S], Solution]) -> None:
+    def __init__(self, search_fn: Callable[[Problem[S, A], S], Solution],
+                 store: Optional[SolutionStore] = None, config: Optional[str] = None) -> None:
         super().__init__()
         self.search_fn = search_fn
+        self.store = store
+        self.config = config or describe(search_fn)
         # The policy will store the action to do for each state so as not to search again after each observation
         self.policy: Dict[S, A] = {}
     
     def act(self, problem: Problem[S, A], state: S) -> A:
         # This state is not stored in the policy, we need to search for a solution 
         if state not in self.policy:
-            solution = self.search_fn(problem, state)
+            search = lambda: self.search_fn(problem, state)
+            solution = search() if self.store is None else self.store.solve(problem, state, self.config, search)
             # if no solution was found, we return None
             if solution is None:
                 self.policy[state] = None
@@ -45,18 +52,24 @@ class UninformedSearchAgent(GoalBasedAgent[S, A]):
         return self.policy.get(state)
 
 # This agent applies an informed search algorithm to find the solution to goal for the given state
+# The solution store and the config are used in the same way as the uninformed search agent
+# (the default config also contains the heuristic's name)
 class InformedSearchAgent(GoalBasedAgent[S, A]):
-    def __init__(self, search_fn: Callable[[Problem[S, A], S, HeuristicFunction], Solution], heuristic: HeuristicFunction) -> None:
+    def __init__(self, search_fn: Callable[[Problem[S, A], S, HeuristicFunction], Solution], heuristic: HeuristicFunction,
+                 store: Optional[SolutionStore] = None, config: Optional[str] = None) -> None:
         super().__init__()
         self.search_fn = search_fn
         self.heuristic = heuristic
+        self.store = store
+        self.config = config or f"{describe(search_fn)}:{describe(heuristic)}"
         # The policy will store the action to do for each state so as not to search again after each observation
         self.policy: Dict[S, A] = {}
     
     def act(self, problem: Problem[S, A], state: S) -> A:
         # This state is not stored in the policy, we need to search for a solution 
         if state not in self.policy:
-            solution = self.search_fn(problem, state, self.heuristic)
+            search = lambda: self.search_fn(problem, state, self.heuristic)
+            solution = search() if self.store is None else self.store.solve(problem, state, self.config, search)
             # if no solution was found, we return None
             if solution is None:
                 self.policy[state] = None
@@ -0,0 +1,115 @@
+from typing import Dict, List, Optional, Tuple
+import heapq
+
+from graph import GraphNode, GraphRoutingProblem
+from problem import Solution
+
+# This file contains bidirectional versions of breadth first search and uniform cost search for the graph routing problem
+# Since both the start and the goal nodes are known, we search forward from the start and backward from the goal
+# until the two searches meet, which expands roughly the square root of the nodes expanded by a single search.
+# Both functions have the same signature as the uninformed search functions and return the same solution type
+# (the list of nodes visited after the initial state).
+
+# This function returns the reverse adjacency (the list of nodes that have an edge to each node)
+# It is built once per problem and stored in the problem cache
+def reverse_adjacency(problem: GraphRoutingProblem) -> Dict[GraphNode, List[GraphNode]]:
+    cache = problem.cache()
+    if 'reverse_adjacency' not in cache:
+        reverse = {node: [] for node in problem.adjacency}
+        for node, neighbors in problem.adjacency.items():
+            for neighbor in neighbors:
+                reverse.setdefault(neighbor, []).append(node)
+        cache['reverse_adjacency'] = reverse
+    return cache['reverse_adjacency']
+
+# This function joins the forward path (from the start to the meeting node) and the backward path (from the meeting node to the goal)
+def join_paths(forward_parents: Dict[GraphNode, Optional[GraphNode]], backward_parents: Dict[GraphNode, Optional[GraphNode]], meeting: GraphNode) -> List[GraphNode]:
+    path = []
+    node = meeting
+    while forward_parents[node] is not None:
+        path.append(node)
+        node = forward_parents[node]
+    path.reverse()
+    node = backward_parents[meeting]
+    while node is not None:
+        path.append(node)
+        node = backward_parents[node]
+    return path
+
+def BidirectionalBreadthFirstSearch(problem: GraphRoutingProblem, initial_state: GraphNode) -> Solution:
+    goal = problem.goal
+    if problem.is_goal(initial_state):
+        return []
+    reverse = reverse_adjacency(problem)
+    # parents[0] and parents[1] store the parent of every discovered node in the forward and backward searches
+    # depths[0] and depths[1] store the number of edges between every discovered node and the start or the goal
+    parents: Tuple[Dict[GraphNode, Optional[GraphNode]], ...] = ({initial_state: None}, {goal: None})
+    depths: Tuple[Dict[GraphNode, int], ...] = ({initial_state: 0}, {goal: 0})
+    layers: List[List[GraphNode]] = [[initial_state], [goal]]
+    while layers[0] and layers[1]:
+        # Expand a whole layer of the side with the smaller frontier
+        side = 0 if len(layers[0]) <= len(layers[1]) else 1
+        other = 1 - side
+        best, meeting = None, None
+        next_layer = []
+        for node in layers[side]:
+            neighbors = problem.get_actions(node) if side == 0 else reverse.get(node, [])
+            for neighbor in neighbors:
+                if neighbor in parents[side]: continue
+                parents[side][neighbor] = node
+                depths[side][neighbor] = depths[side][node] + 1
+                next_layer.append(neighbor)
+                # Check if the two searches met, but finish the layer since a shorter meeting could be found in it
+                if neighbor in parents[other]:
+                    length = depths[side][neighbor] + depths[other][neighbor]
+                    if best is None or length < best:
+                        best, meeting = length, neighbor
+        if meeting is not None:
+            return join_paths(parents[0], parents[1], meeting)
+        layers[side] = next_layer
+    return None
+
+def BidirectionalUniformCostSearch(problem: GraphRoutingProblem, initial_state: GraphNode) -> Solution:
+    goal = problem.goal
+    if problem.is_goal(initial_state):
+        return []
+    reverse = reverse_adjacency(problem)
+    # costs[0] and costs[1] store the best known path cost from the start to every node and from every node to the goal
+    costs: Tuple[Dict[GraphNode, float], ...] = ({initial_state: 0}, {goal: 0})
+    parents: Tuple[Dict[GraphNode, Optional[GraphNode]], ...] = ({initial_state: None}, {goal: None})
+    # frontiers are priority queues of (cost, order, node) tuples, the order prevents comparing nodes
+    frontiers: Tuple[List[Tuple[float, int, GraphNode]], ...] = ([(0, 0, initial_state)], [(0, 0, goal)])
+    explored = (set(), set())
+    order = 1
+    # best is the cost of the cheapest path found so far which passes through the meeting node
+    best, meeting = float('inf'), None
+    while frontiers[0] and frontiers[1]:
+        # Any path that was not found yet costs at least the sum of the two minimum costs in the frontiers,
+        # so once this sum reaches the best path cost, the best path is optimal
+        if frontiers[0][0][0] + frontiers[1][0][0] >= best:
+            break
+        # Expand the side with the smaller minimum cost
+        side = 0 if frontiers[0][0][0] <= frontiers[1][0][0] else 1
+        other = 1 - side
+        cost, _, node = heapq.heappop(frontiers[side])
+        # Skip the stale entries
+        if node in explored[side]:
+            continue
+        explored[side].add(node)
+        neighbors = problem.get_actions(node) if side == 0 else reverse.get(node, [])
+        for neighbor in neighbors:
+            # The edge is always traversed in the forward direction to compute its cost
+            edge_cost = problem.get_cost(node, neighbor) if side == 0 else problem.get_cost(neighbor, node)
+            new_cost = cost + edge_cost
+            if new_cost < costs[side].get(neighbor, float('inf')):
+                costs[side][neighbor] = new_cost
+                parents[side][neighbor] = node
+                heapq.heappush(frontiers[side], (new_cost, order, neighbor))
+                order += 1
+            # Check if the neighbor connects the two searches with a cheaper path
+            if neighbor in costs[other] and costs[side][neighbor] + costs[other][neighbor] < best:
+                best = costs[side][neighbor] + costs[other][neighbor]
+                meeting = neighbor
+    if meeting is None:
+        return None
+    return join_paths(parents[0], parents[1], meeting)
@@ -0,0 +1,33 @@
+from typing import Dict
+from sokoban import SokobanProblem
+from search import BreadthFirstSearch
+from helpers.utils import fetch_tracked_call_count
+import argparse, time
+
+# This micro-benchmark measures the raw speed of the sokoban move generation
+# by running breadth first search on each level and reporting the number of expanded nodes per second.
+# Breadth first search is used since it does nothing but expand nodes (no heuristic is computed).
+def expansions_per_second(path: str, repeats: int = 3) -> Dict[str, float]:
+    problem = SokobanProblem.from_file(path)
+    best_time = float('inf')
+    expanded = 0
+    for _ in range(repeats):
+        fetch_tracked_call_count(SokobanProblem.get_actions) # Clear the call counter
+        start = time.perf_counter()
+        BreadthFirstSearch(problem, problem.get_initial_state())
+        best_time = min(best_time, time.perf_counter() - start)
+        expanded = fetch_tracked_call_count(SokobanProblem.get_actions)
+    return {"expanded": expanded, "seconds": best_time, "expansions_per_second": expanded / best_time}
+
+def main(args: argparse.Namespace):
+    for level in args.levels:
+        result = expansions_per_second(level, args.repeats)
+        print(f"{level}: {result['expanded']} nodes in {result['seconds']:.3f} seconds ({result['expansions_per_second']:.0f} nodes/sec)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the sokoban node expansion speed")
+    parser.add_argument("levels", nargs="*", help="paths to the sokoban levels",
+                        default=[f"levels/level{index}.txt" for index in range(1, 5)])
+    parser.add_argument("--repeats", "-r", type=int, default=3, help="the number of runs per level (the fastest is reported)")
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,210 @@
+from array import array
+from typing import Dict, List, Optional
+import argparse, hashlib, heapq, json, mmap, os, struct, sys
+
+from graph import GraphNode, GraphRoutingProblem, graphrouting_heuristic
+
+# This file contains an offline preprocessing stage for the graph routing problem which computes shortest path distances
+# and stores them in a side file next to the graph file ("graphs/graph1.json" -> "graphs/graph1.json.landmarks").
+# There are two modes:
+# 1. For small graphs, all pairs shortest paths are stored, so the heuristic is the exact distance to the goal.
+# 2. For larger graphs, the distances from and to a few landmarks are stored (ALT), and using the triangle inequality:
+#       d(v, goal) >= d(L, goal) - d(L, v)   and   d(v, goal) >= d(v, L) - d(goal, L)
+#    which gives an admissible and consistent heuristic that is usually much tighter than the euclidean distance.
+# The side file contains a header (its length as an 8-byte unsigned integer followed by JSON)
+# then the distances as native 64-bit floats, so it can be memory-mapped at load time without parsing.
+# The header also stores the SHA-256 of the graph file, so a side file that was built for an older version of the graph
+# (whose distances may no longer be lower bounds) is detected by "load_problem" instead of being used.
+
+LANDMARKS_EXTENSION = ".landmarks"
+
+# This is raised when the side file does not match the graph file (e.g. the graph was edited after the side file was built)
+class StaleLandmarksError(Exception):
+    pass
+
+# Returns the SHA-256 of the file's content (used to check that the side file matches its graph)
+def file_digest(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+# This function computes the shortest path distances from the source to every node using Dijkstra's algorithm
+# If reverse is True, the edges are traversed backwards (so the distances are from every node to the source)
+def shortest_distances(problem: GraphRoutingProblem, source: GraphNode, reverse: bool = False) -> Dict[GraphNode, float]:
+    adjacency = problem.adjacency
+    if reverse:
+        adjacency = {node: [] for node in problem.adjacency}
+        for node, neighbors in problem.adjacency.items():
+            for neighbor in neighbors:
+                adjacency.setdefault(neighbor, []).append(node)
+    distances = {source: 0.0}
+    frontier = [(0.0, 0, source)]
+    order = 1
+    while frontier:
+        distance, _, node = heapq.heappop(frontier)
+        if distance > distances[node]: continue
+        for neighbor in adjacency.get(node, []):
+            # The cost is computed along the original direction of the edge
+            cost = problem.get_cost(neighbor, node) if reverse else problem.get_cost(node, neighbor)
+            new_distance = distance + cost
+            if new_distance < distances.get(neighbor, float('inf')):
+                distances[neighbor] = new_distance
+                heapq.heappush(frontier, (new_distance, order, neighbor))
+                order += 1
+    return distances
+
+# This function chooses the landmarks one by one where each new landmark is the node farthest from the chosen ones
+def choose_landmarks(problem: GraphRoutingProblem, nodes: List[GraphNode], count: int) -> List[GraphNode]:
+    landmarks = [nodes[0]]
+    closest = shortest_distances(problem, nodes[0])
+    while len(landmarks) < min(count, len(nodes)):
+        candidates = [node for node in nodes if node not in landmarks]
+        # Nodes that are unreachable from all the landmarks are the farthest
+        farthest = max(candidates, key=lambda node: closest.get(node, float('inf')))
+        landmarks.append(farthest)
+        for node, distance in shortest_distances(problem, farthest).items():
+            if distance < closest.get(node, float('inf')):
+                closest[node] = distance
+    return landmarks
+
+# This function runs the preprocessing for the graph in the given file and writes the side file
+def build_landmarks(graph_path: str, landmark_count: int = 8, apsp_limit: int = 256, output_path: Optional[str] = None) -> str:
+    problem = GraphRoutingProblem.from_file(graph_path)
+    nodes = sorted(problem.adjacency, key=lambda node: node.name)
+    infinity = float('inf')
+    table = array('d')
+    if len(nodes) <= apsp_limit:
+        mode, landmarks = "apsp", []
+        # table[i * n + j] is the distance from node i to node j
+        for node in nodes:
+            distances = shortest_distances(problem, node)
+            table.extend(distances.get(other, infinity) for other in nodes)
+    else:
+        mode, landmarks = "landmarks", choose_landmarks(problem, nodes, landmark_count)
+        # The first k rows are the distances from each landmark and the next k rows are the distances to each landmark
+        for reverse in (False, True):
+            for landmark in landmarks:
+                distances = shortest_distances(problem, landmark, reverse)
+                table.extend(distances.get(node, infinity) for node in nodes)
+    header = json.dumps({
+        "mode": mode,
+        "byteorder": sys.byteorder,
+        "source_sha256": file_digest(graph_path),
+        "nodes": [node.name for node in nodes],
+        "landmarks": [landmark.name for landmark in landmarks]
+    }).encode()
+    # Pad the header so that the table is aligned to 8 bytes
+    header += b" " * (-len(header) % 8)
+    output_path = output_path or graph_path + LANDMARKS_EXTENSION
+    with open(output_path, 'wb') as f:
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        table.tofile(f)
+    return output_path
+
+# The landmark tables hold a memory-mapped view of the side file
+# If the path of the graph file is given, the side file must have been built from the current content of the graph file
+class LandmarkTables:
+    def __init__(self, path: str, graph_path: Optional[str] = None) -> None:
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header_length, = struct.unpack_from("<Q", self.buffer, 0)
+        header = json.loads(bytes(self.buffer[8:8 + header_length]))
+        if header["byteorder"] != sys.byteorder:
+            raise Exception(f"The landmarks file {path} was built on a machine with a different byte order")
+        if graph_path is not None and header.get("source_sha256") != file_digest(graph_path):
+            self.buffer.close()
+            raise StaleLandmarksError(f"The landmarks file {path} was not built from the current content of {graph_path}")
+        self.path = path
+        self.mode: str = header["mode"]
+        self.index: Dict[str, int] = {name: index for index, name in enumerate(header["nodes"])}
+        self.size = len(self.index)
+        self.landmark_count = len(header["landmarks"])
+        self.table = memoryview(self.buffer)[8 + header_length:].cast('d')
+
+    # Returns the index of the node in the tables (and raises a clear error if the tables do not contain the node)
+    def node_index(self, node: GraphNode) -> int:
+        try:
+            return self.index[node.name]
+        except KeyError:
+            raise Exception(f"The node '{node.name}' is not in the landmarks file {self.path} (rebuild it for the current graph)") from None
+
+    # Returns a function that computes a lower bound on the distance from any node to the given goal
+    def lower_bound_to(self, goal: GraphNode):
+        table, index, size = self.table, self.index, self.size
+        infinity = float('inf')
+        goal_index = self.node_index(goal)
+        if self.mode == "apsp":
+            def exact_distance(node: GraphNode) -> float:
+                node_index = index.get(node.name)
+                if node_index is None: node_index = self.node_index(node)
+                return table[node_index * size + goal_index]
+            return exact_distance
+        count = self.landmark_count
+        # The distances between the goal and the landmarks are fixed for all the queries to this goal
+        from_landmarks = [(row * size, table[row * size + goal_index]) for row in range(count)]
+        to_landmarks = [((count + row) * size, table[(count + row) * size + goal_index]) for row in range(count)]
+        def lower_bound(node: GraphNode) -> float:
+            node_index = index.get(node.name)
+            if node_index is None: node_index = self.node_index(node)
+            bound = 0.0
+            for offset, landmark_to_goal in from_landmarks:
+                landmark_to_node = table[offset + node_index]
+                if landmark_to_goal != infinity and landmark_to_node != infinity:
+                    bound = max(bound, landmark_to_goal - landmark_to_node)
+            for offset, goal_to_landmark in to_landmarks:
+                node_to_landmark = table[offset + node_index]
+                if node_to_landmark != infinity and goal_to_landmark != infinity:
+                    bound = max(bound, node_to_landmark - goal_to_landmark)
+                elif node_to_landmark == infinity and goal_to_landmark != infinity:
+                    # If the goal can reach the landmark but the node cannot, then the node cannot reach the goal
+                    return infinity
+            return bound
+        return lower_bound
+
+# Rebuilds the side file of the graph with the same number of landmarks as the existing side file
+def rebuild_landmarks(graph_path: str) -> str:
+    landmarks_path = graph_path + LANDMARKS_EXTENSION
+    with open(landmarks_path, 'rb') as f:
+        header_length, = struct.unpack("<Q", f.read(8))
+        landmark_count = len(json.loads(f.read(header_length))["landmarks"]) or 8
+    return build_landmarks(graph_path, landmark_count, output_path=landmarks_path)
+
+# Read a graph routing problem from file and attach its landmark tables (if the side file exists)
+# If the side file does not match the graph file, StaleLandmarksError is raised
+# unless "rebuild" is True, in which case the side file is rebuilt (see "rebuild_landmarks") before it is loaded
+def load_problem(path: str, rebuild: bool = False) -> GraphRoutingProblem:
+    problem = GraphRoutingProblem.from_file(path)
+    landmarks_path = path + LANDMARKS_EXTENSION
+    if os.path.exists(landmarks_path):
+        try:
+            tables = LandmarkTables(landmarks_path, path)
+        except StaleLandmarksError:
+            if not rebuild: raise
+            rebuild_landmarks(path)
+            tables = LandmarkTables(landmarks_path, path)
+        problem.cache()['landmarks'] = tables
+    return problem
+
+# This heuristic uses the landmark tables (if they were loaded) and the euclidean distance, and returns the larger of the two
+# Since both are consistent, their maximum is also consistent
+def landmark_heuristic(problem: GraphRoutingProblem, state: GraphNode) -> float:
+    cache = problem.cache()
+    tables: Optional[LandmarkTables] = cache.get('landmarks')
+    if tables is None:
+        return graphrouting_heuristic(problem, state)
+    if cache.get('landmarks_goal') != problem.goal:
+        cache['landmarks_goal'] = problem.goal
+        cache['landmarks_bound'] = tables.lower_bound_to(problem.goal)
+    return max(cache['landmarks_bound'](state), graphrouting_heuristic(problem, state))
+
+if __name__ == "__main__":
+    # Read the arguments from the command line
+    parser = argparse.ArgumentParser(description="Precompute the landmark tables for graph routing problems")
+    parser.add_argument("graphs", nargs="+", help="paths to the graphs")
+    parser.add_argument("--landmarks", "-l", type=int, default=8, help="the number of landmarks for large graphs")
+    parser.add_argument("--apsp-limit", "-n", type=int, default=256,
+                        help="graphs with at most this number of nodes store all pairs shortest paths instead of landmarks")
+    args = parser.parse_args()
+    for graph_path in args.graphs:
+        output_path = build_landmarks(graph_path, args.landmarks, args.apsp_limit)
+        print(f"{graph_path} -> {output_path}")
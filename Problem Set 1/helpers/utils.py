@@ -86,6 +86,12 @@ class CacheContainer:
             setattr(self, "_cache", cache)
             return cache
 
+    # The cache is not pickled since it can hold unpicklable data (such as functions) and it can always be rebuilt
+    def __getstate__(self) -> Dict[Any, Any]:
+        state = self.__dict__.copy()
+        state.pop("_cache", None)
+        return state
+
 # Unused
 def _cache_function(self) -> Dict[Any, Any]:
     if hasattr(self, "_cache"):
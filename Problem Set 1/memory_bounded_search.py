@@ -0,0 +1,221 @@
+from typing import Dict, List, Optional
+import heapq
+
+from problem import HeuristicFunction, Problem, S, A, Solution
+from search import HeuristicMemo
+from search_statistics import SearchRun, collect_statistics
+
+# This file contains memory bounded informed search functions which have the same signature as AStarSearch
+# (with an extra optional argument to configure the memory limit):
+# 1. Iterative deepening A* which runs depth first searches with an increasing f-cost bound.
+#    It only stores the current path and a transposition table of bounded size.
+# 2. Simplified memory bounded A* which behaves like A* until it reaches a hard limit on the number of stored nodes,
+#    then it forgets the worst leaves while remembering their f-costs in their parents.
+#    Successors whose states are already stored with a lower or equal cost are skipped, so if the budget is too tight,
+#    the returned solution may not be optimal.
+# Both functions record the number of expanded nodes and the peak number of stored nodes,
+# which can be read and reset using "fetch_memory_bounded_stats()".
+# Note that the peak number of stored nodes is only a proxy for the memory use (the size of a node depends on its state).
+# The peak memory in bytes is measured by the statistics collector (see search_statistics.py) as for the other search functions,
+# e.g. by running play_sokoban.py or play_graph.py with "--stats" and "--trace-memory".
+
+stats: Dict[str, int] = {"expanded": 0, "peak_nodes": 0}
+
+def fetch_memory_bounded_stats() -> Dict[str, int]:
+    result = dict(stats)
+    stats["expanded"] = stats["peak_nodes"] = 0
+    return result
+
+
+@collect_statistics
+def IterativeDeepeningAStarSearch(problem: Problem[S, A], initial_state: S, heuristic: HeuristicFunction, table_size: int = 2**16) -> Solution:
+    h = HeuristicMemo.of(problem, heuristic)
+    # If statistics are being collected, the problem reports its calls to the active run
+    run = SearchRun.current()
+    if run is not None:
+        problem = run.watch(problem, None, None)
+        h = run.timed(h)
+    if problem.is_goal(initial_state):
+        return []
+    bound = h(initial_state)
+    expanded, peak_nodes = 0, 0
+    while True:
+        # The transposition table stores the least path cost with which each state was reached in this iteration
+        # A state reached again with a greater or equal cost is skipped since its subtree was already searched with a larger budget
+        # When the table is full, new states are not added (but the stored ones are still updated)
+        table: Dict[S, float] = {initial_state: 0}
+        next_bound = float('inf')
+        # The stack stores (state, path cost, remaining actions) for every state on the current path
+        path: List[A] = []
+        stack = [(initial_state, 0, iter(problem.get_actions(initial_state)))]
+        expanded += 1
+        while stack:
+            state, g, actions = stack[-1]
+            action = next(actions, stack)
+            # If all the actions were tried, backtrack
+            if action is stack:
+                stack.pop()
+                if path: path.pop()
+                continue
+            next_state = problem.get_successor(state, action)
+            next_g = g + problem.get_cost(state, action)
+            f = next_g + h(next_state)
+            # Nodes outside the bound are cut off, the least of their costs becomes the next bound
+            if f > bound:
+                next_bound = min(next_bound, f)
+                continue
+            seen = table.get(next_state)
+            if seen is not None and seen <= next_g:
+                continue
+            if seen is not None or len(table) < table_size:
+                table[next_state] = next_g
+            path.append(action)
+            if problem.is_goal(next_state):
+                stats["expanded"] += expanded
+                stats["peak_nodes"] = max(stats["peak_nodes"], peak_nodes, len(stack) + len(table))
+                return path
+            stack.append((next_state, next_g, iter(problem.get_actions(next_state))))
+            expanded += 1
+            peak_nodes = max(peak_nodes, len(stack) + len(table))
+        if next_bound == float('inf'):
+            stats["expanded"] += expanded
+            stats["peak_nodes"] = max(stats["peak_nodes"], peak_nodes)
+            return None
+        bound = next_bound
+
+
+# A node in the memory bounded search tree
+#   f is the backed up f-cost (the least f-cost of any known path to a goal through this node)
+#   children contains the successors that are currently stored in memory
+#   forgotten is the least f-cost of the successors that were removed from memory
+#   version is used to invalidate the old entries of the node in the priority queues
+class SMANode:
+    __slots__ = ("state", "parent", "action", "g", "f", "depth", "children", "forgotten", "version", "in_open")
+
+    def __init__(self, state, parent: Optional['SMANode'], action, g: float, f: float, depth: int) -> None:
+        self.state = state
+        self.parent = parent
+        self.action = action
+        self.g = g
+        self.f = f
+        self.depth = depth
+        self.children: List[SMANode] = []
+        self.forgotten = float('inf')
+        self.version = 0
+        self.in_open = False
+
+    def path(self) -> List:
+        path = []
+        node = self
+        while node.parent is not None:
+            path.append(node.action)
+            node = node.parent
+        path.reverse()
+        return path
+
+
+@collect_statistics
+def SimplifiedMemoryBoundedAStarSearch(problem: Problem[S, A], initial_state: S, heuristic: HeuristicFunction, node_budget: int = 2**16) -> Solution:
+    h = HeuristicMemo.of(problem, heuristic)
+    # If statistics are being collected, the problem reports its calls to the active run
+    run = SearchRun.current()
+    if run is not None:
+        problem = run.watch(problem, None, None)
+        h = run.timed(h)
+    infinity = float('inf')
+    # The leaves are stored in two priority queues:
+    #   best is ordered by the least f-cost then the deepest node (to choose the node to expand)
+    #   worst is ordered by the largest f-cost then the shallowest node (to choose the node to forget)
+    best, worst = [], []
+    order = 0
+
+    def push(node: SMANode) -> None:
+        nonlocal order
+        node.version += 1
+        node.in_open = True
+        heapq.heappush(best, (node.f, -node.depth, order, node.version, node))
+        heapq.heappush(worst, (-node.f, node.depth, order, node.version, node))
+        order += 1
+
+    def top(queue: list) -> Optional[SMANode]:
+        while queue:
+            *_, version, node = queue[0]
+            if node.in_open and node.version == version:
+                return node
+            heapq.heappop(queue)
+        return None
+
+    # After the children of a node change, its f-cost becomes the least f-cost of its children (including the forgotten ones)
+    def backup(node: SMANode) -> None:
+        while node is not None and node.children:
+            f = min(min(child.f for child in node.children), node.forgotten)
+            if f == node.f: break
+            node.f = f
+            node = node.parent
+
+    root = SMANode(initial_state, None, None, 0, h(initial_state), 0)
+    push(root)
+    # stored maps every state in memory to its node, a successor is skipped if its state is stored with a lower or equal cost
+    # (the stored node represents it, and if it is ever forgotten, its f-cost is remembered by its parent)
+    stored: Dict[S, SMANode] = {initial_state: root}
+    memory, expanded, peak_nodes = 1, 0, 1
+    while True:
+        node = top(best)
+        # If the best leaf has an infinite cost, no solution can be found within the node budget
+        if node is None or node.f == infinity:
+            stats["expanded"] += expanded
+            stats["peak_nodes"] = max(stats["peak_nodes"], peak_nodes)
+            return None
+        if problem.is_goal(node.state):
+            stats["expanded"] += expanded
+            stats["peak_nodes"] = max(stats["peak_nodes"], peak_nodes)
+            return node.path()
+        node.in_open = False
+        expanded += 1
+        # Avoid cycles by skipping the successors that are already on the path to this node
+        ancestors = set()
+        ancestor = node
+        while ancestor is not None:
+            ancestors.add(ancestor.state)
+            ancestor = ancestor.parent
+        node.children, node.forgotten = [], infinity
+        for action in problem.get_actions(node.state):
+            state = problem.get_successor(node.state, action)
+            if state in ancestors: continue
+            g = node.g + problem.get_cost(node.state, action)
+            duplicate = stored.get(state)
+            if duplicate is not None and duplicate.g <= g: continue
+            # A non goal node at the maximum depth that fits in memory can never lead to a solution
+            if node.depth + 1 >= node_budget - 1 and not problem.is_goal(state):
+                f = infinity
+            else:
+                f = max(node.f, g + h(state))
+            child = SMANode(state, node, action, g, f, node.depth + 1)
+            node.children.append(child)
+            stored[state] = child
+            push(child)
+        memory += len(node.children)
+        if node.children:
+            backup(node)
+        else:
+            # A dead end is kept as a leaf with an infinite cost so that it is forgotten first
+            node.f = infinity
+            push(node)
+            backup(node.parent)
+        # Forget the worst leaves until the tree fits in the node budget
+        # (so the budget can only be exceeded temporarily by the successors of the expanded node)
+        while memory > node_budget:
+            leaf = top(worst)
+            if leaf is None or leaf.parent is None: break
+            leaf.in_open = False
+            parent = leaf.parent
+            parent.children.remove(leaf)
+            if stored.get(leaf.state) is leaf:
+                del stored[leaf.state]
+            parent.forgotten = min(parent.forgotten, leaf.f)
+            memory -= 1
+            # If all the children are forgotten, the parent becomes a leaf again and will regenerate them when expanded
+            if not parent.children:
+                parent.f = parent.forgotten
+                push(parent)
+        peak_nodes = max(peak_nodes, memory)
@@ -0,0 +1,267 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import argparse, heapq, multiprocessing, queue, random, time
+
+from problem import HeuristicFunction, Problem, S, A, Solution
+from sokoban import SokobanProblem, SokobanState, PackedSokobanProblem, PackedSokobanState
+from search import HeuristicMemo
+
+# This file contains a hash distributed parallel A* search (HDA*).
+# Every state is owned by exactly one worker process which is selected by hashing the state (a Zobrist hash for sokoban).
+# Each worker has its own open list and its own table of the best path cost of its states,
+# so duplicate detection never needs any shared data. When a worker generates a state owned by another worker,
+# it sends the node to the owner in a batch (using a multiprocessing queue per worker).
+# When a worker pops a goal, it updates the shared incumbent (the cheapest solution found so far) and all the workers
+# ignore the nodes whose f values are not less than the incumbent cost.
+# Termination is detected by the main process using the counts of the sent and the received nodes:
+# Each worker publishes (under a shared lock) the number of nodes it sent, the number of nodes it received and
+# the least f in its open list. A worker only publishes between expansion rounds (after every generated child is either
+# inserted in its open list or counted as sent) or right after it receives nodes, so a published status never misses
+# a node that the worker holds. A sender always counts its batches before putting them in the queues, so if the snapshot
+# shows that every sent node was received and that no worker has a node with an f less than the incumbent cost,
+# then the incumbent is optimal (given an admissible heuristic) or there is no solution (if the incumbent is infinite).
+# The nodes store their parents as (worker, node index) pairs, so the main process reconstructs the solution
+# by asking the owner of each node in the path for its parent and action.
+
+# A Zobrist table assigns a random 64-bit key to each (cell, player) and (cell, crate) pair.
+# The hash of a state is the XOR of the keys of the player cell and the crate cells.
+# The keys are generated from a fixed seed so that they are the same in all the processes.
+class ZobristTable:
+    __slots__ = ("player", "crates")
+
+    def __init__(self, cells, seed: int = 0) -> None:
+        rng = random.Random(seed)
+        cells = sorted(cells, key=lambda cell: (cell.y, cell.x))
+        self.player = {cell: rng.getrandbits(64) for cell in cells}
+        self.crates = {cell: rng.getrandbits(64) for cell in cells}
+
+    def __call__(self, state: SokobanState) -> int:
+        key = self.player[state.player]
+        crates = self.crates
+        for crate in state.crates:
+            key ^= crates[crate]
+        return key
+
+# Returns the function that hashes the states of the problem to select their owners
+# The built-in hash is only consistent across processes for values whose hashes are not randomized (e.g. not strings)
+# or for processes that are forked from the same parent (which is the default on Linux)
+def state_hasher(problem: Problem[S, A]) -> Callable[[S], int]:
+    if isinstance(problem, SokobanProblem):
+        return ZobristTable(problem.layout.walkable)
+    if isinstance(problem, PackedSokobanProblem):
+        return packed_hash
+    return hash
+
+# The packed states are already integers, so they are hashed directly
+def packed_hash(state: PackedSokobanState) -> int:
+    return hash((state.player, state.crates))
+
+# The sokoban states contain a reference to their layout which is compared by identity,
+# so they are sent without the layout and the receiver attaches its own copy of the layout
+def encode_state(state: S) -> Any:
+    if isinstance(state, (SokobanState, PackedSokobanState)):
+        return (type(state), state.player, state.crates)
+    return state
+
+def decode_state(problem: Problem[S, A], message: Any) -> S:
+    if isinstance(message, tuple) and len(message) == 3 and message[0] in (SokobanState, PackedSokobanState):
+        state_type, player, crates = message
+        return state_type(problem.layout, player, crates)
+    return message
+
+# The index of each value in the status array of a worker
+SENT, RECEIVED, MIN_F = 0, 1, 2
+
+def hda_worker(index: int, problem: Problem[S, A], heuristic: HeuristicFunction, hasher: Callable[[S], int],
+               inboxes: List[Any], results: Any, status: Any, lock: Any, incumbent: Any, goal: Any, stop: Any,
+               batch_size: int) -> None:
+    count = len(inboxes)
+    inbox = inboxes[index]
+    h = HeuristicMemo.of(problem, heuristic)
+    frontier: List[Tuple[float, float, int, S, float]] = [] # (f, -g, node, state, g) so ties prefer deeper nodes
+    best: Dict[S, float] = {}
+    # The search tree of the nodes owned by this worker
+    parent_workers: List[int] = []
+    parent_nodes: List[int] = []
+    actions: List[A] = []
+    outgoing: List[List[Any]] = [[] for _ in range(count)]
+    # The path reconstruction requests can arrive before the worker notices that the search stopped, so they are kept for later
+    requests: List[Any] = []
+    sent = received = expanded = 0
+
+    # Adds a node to the open list unless its state was already reached with a lower or equal path cost
+    def insert(state: S, g: float, parent_worker: int, parent_node: int, action: A) -> None:
+        if g >= best.get(state, float('inf')): return
+        f = g + h(state)
+        if f >= incumbent.value: return
+        best[state] = g
+        parent_workers.append(parent_worker)
+        parent_nodes.append(parent_node)
+        actions.append(action)
+        heapq.heappush(frontier, (f, -g, len(actions) - 1, state, g))
+
+    def publish() -> None:
+        with lock:
+            status[3 * index + SENT] = sent
+            status[3 * index + RECEIVED] = received
+            status[3 * index + MIN_F] = frontier[0][0] if frontier else float('inf')
+
+    # Sends all the generated nodes that are owned by other workers
+    # They are counted and published before they are put in the queues, so they are never in flight without being counted
+    def flush() -> None:
+        nonlocal sent
+        sent += sum(len(batch) for batch in outgoing)
+        publish()
+        for owner in range(count):
+            if outgoing[owner]:
+                inboxes[owner].put(("nodes", outgoing[owner]))
+                outgoing[owner] = []
+
+    def receive(message) -> None:
+        nonlocal received
+        if message[0] == "nodes":
+            for encoded, g, parent_worker, parent_node, action in message[1]:
+                insert(decode_state(problem, encoded), g, parent_worker, parent_node, action)
+            received += len(message[1])
+            publish()
+        else:
+            requests.append(message)
+
+    while not stop.is_set():
+        # Receive all the nodes that arrived
+        idle = True
+        while True:
+            try:
+                message = inbox.get_nowait()
+            except queue.Empty:
+                break
+            receive(message)
+            idle = False
+        # Expand a round of nodes
+        bound = incumbent.value
+        for _ in range(batch_size):
+            if not frontier or frontier[0][0] >= bound: break
+            f, _, node, state, g = heapq.heappop(frontier)
+            if g > best[state]: continue # A cheaper path to this state was found after this node was pushed
+            idle = False
+            if problem.is_goal(state):
+                with lock:
+                    if g < incumbent.value:
+                        incumbent.value = g
+                        goal[0], goal[1] = index, node
+                bound = incumbent.value
+                continue
+            expanded += 1
+            for action in problem.get_actions(state):
+                next_state = problem.get_successor(state, action)
+                next_g = g + problem.get_cost(state, action)
+                owner = hasher(next_state) % count
+                if owner == index:
+                    insert(next_state, next_g, index, node, action)
+                else:
+                    outgoing[owner].append((encode_state(next_state), next_g, index, node, action))
+        # The status is only published once the round is done (never in the middle of an expansion)
+        # and the generated nodes are sent so that no node is held back while this worker waits
+        flush()
+        if idle:
+            try:
+                receive(inbox.get(timeout=0.005))
+            except queue.Empty:
+                pass
+
+    # After the search stops, the worker answers the path reconstruction requests until it is told to exit
+    while True:
+        message = requests.pop(0) if requests else inbox.get()
+        if message[0] == "parent":
+            node = message[1]
+            results.put((parent_workers[node], parent_nodes[node], actions[node]))
+        elif message[0] == "exit":
+            results.put(("expanded", expanded))
+            return
+
+# Stores the statistics of the last parallel search (the total and the per worker number of expanded nodes)
+stats = {"expanded": 0, "worker_expanded": []}
+
+def fetch_parallel_stats() -> Dict[str, Any]:
+    result = dict(stats)
+    stats["expanded"], stats["worker_expanded"] = 0, []
+    return result
+
+def ParallelAStarSearch(problem: Problem[S, A], initial_state: S, heuristic: HeuristicFunction,
+                        workers: int = 2, batch_size: int = 64, poll_interval: float = 0.002) -> Solution:
+    # Forking is preferred since it does not need to pickle the problem and it keeps the built-in hashes consistent
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+    inboxes = [context.Queue() for _ in range(workers)]
+    results = context.Queue()
+    lock = context.Lock()
+    status = context.Array('d', [0.0, 0.0, float('inf')] * workers, lock=False)
+    incumbent = context.Value('d', float('inf'), lock=False)
+    goal = context.Array('q', [-1, -1], lock=False)
+    stop = context.Event()
+    hasher = state_hasher(problem)
+    processes = [
+        context.Process(target=hda_worker, daemon=True, args=(
+            index, problem, heuristic, hasher, inboxes, results, status, lock, incumbent, goal, stop, batch_size))
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        # The main process sends the initial node (so it is counted as a sent node)
+        inboxes[hasher(initial_state) % workers].put(("nodes", [(encode_state(initial_state), 0, -1, -1, None)]))
+        while True:
+            time.sleep(poll_interval)
+            with lock:
+                snapshot = status[:]
+                bound = incumbent.value
+                goal_worker, goal_node = goal[0], goal[1]
+            if 1 + sum(snapshot[SENT::3]) == sum(snapshot[RECEIVED::3]) and all(f >= bound for f in snapshot[MIN_F::3]):
+                break
+        stop.set()
+        solution = None
+        if goal_worker >= 0:
+            # Follow the parents from the goal to the root
+            solution = []
+            worker, node = goal_worker, goal_node
+            while True:
+                inboxes[worker].put(("parent", node))
+                worker, node, action = results.get()
+                if worker < 0: break
+                solution.append(action)
+            solution.reverse()
+        for inbox in inboxes:
+            inbox.put(("exit",))
+        worker_expanded = [results.get()[1] for _ in range(workers)]
+        stats["expanded"] += sum(worker_expanded)
+        stats["worker_expanded"] = worker_expanded
+        for process in processes:
+            process.join()
+        return solution
+    finally:
+        stop.set()
+        for process in processes:
+            if process.is_alive(): process.terminate()
+
+def main(args: argparse.Namespace):
+    from sokoban_heuristic import strong_heuristic
+    baseline = None
+    print(f"{'Workers':>7} {'Time (s)':>9} {'Speedup':>8} {'Expanded':>9} {'Cost':>5}")
+    for workers in args.workers:
+        problem = SokobanProblem.from_file(args.level)
+        start = time.perf_counter()
+        solution = ParallelAStarSearch(problem, problem.get_initial_state(), strong_heuristic, workers, args.batch_size)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        expanded = fetch_parallel_stats()["expanded"]
+        cost = "-" if solution is None else len(solution)
+        print(f"{workers:>7} {elapsed:>9.3f} {baseline / elapsed:>8.2f} {expanded:>9} {cost:>5}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the speedup of the parallel A* search on a sokoban level")
+    parser.add_argument("level", help="path to the sokoban level")
+    parser.add_argument("--workers", "-w", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="the numbers of worker processes to measure (the speedup is relative to the first)")
+    parser.add_argument("--batch-size", "-bs", type=int, default=64,
+                        help="the number of nodes expanded in one round (the nodes generated in a round are sent together)")
+    args = parser.parse_args()
+    main(args)
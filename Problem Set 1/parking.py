@@ -134,3 +134,100 @@ class ParkingProblem(Problem[ParkingState, ParkingAction]):
     def from_file(path: str) -> 'ParkingProblem':
         with open(path, 'r') as f:
             return ParkingProblem.from_text(f.read())
+
+
+# The packed parking state stores the car positions as flat cell indices (y * width + x) where state[0][i] is the cell of car 'i'
+# and state[1] is a bitmask of the occupied cells, so checking if a cell is occupied is a single shift and mask
+PackedParkingState = Tuple[Tuple[int, ...], int]
+
+
+# This is the implementation of the parking problem using the packed states
+# It has the same actions, costs and solutions as the parking problem,
+# but the move generation only uses precomputed tables and integer operations
+class PackedParkingProblem(Problem[PackedParkingState, ParkingAction]):
+    source: ParkingProblem # The original parking problem
+    width: int # The width of the parking lot.
+    offsets: Dict[Direction, int] # The cell index offset of each direction.
+    neighbors: Tuple[Tuple[Tuple[Direction, int], ...], ...] # For each cell, the directions and the cells which a car can move to (ignoring the other cars).
+    slot_owners: Tuple[int, ...] # For each cell, the index of the car which owns the parking slot in this cell (or -1 if it is not a slot).
+    goal: Tuple[int, ...] # The cells of the parking slots where goal[i] is the slot of car 'i' (or None if some car has no slot).
+    initial_state: PackedParkingState
+
+    def get_initial_state(self) -> PackedParkingState:
+        return self.initial_state
+
+    def is_goal(self, state: PackedParkingState) -> bool:
+        return state[0] == self.goal
+
+    def get_actions(self, state: PackedParkingState) -> List[ParkingAction]:
+        cells, occupied = state
+        neighbors = self.neighbors
+        return [(car_index, direction)
+                for car_index, cell in enumerate(cells)
+                for direction, new_cell in neighbors[cell]
+                if not (occupied >> new_cell) & 1]
+
+    def get_successor(self, state: PackedParkingState, action: ParkingAction) -> PackedParkingState:
+        car_index, direction = action
+        cells, occupied = state
+        cell = cells[car_index]
+        new_cell = cell + self.offsets[direction]
+        return cells[:car_index] + (new_cell,) + cells[car_index+1:], occupied ^ (1 << cell) ^ (1 << new_cell)
+
+    def get_cost(self, state: PackedParkingState, action: ParkingAction) -> float:
+        car_index, direction = action
+        owner = self.slot_owners[state[0][car_index] + self.offsets[direction]]
+        # Moving to another car's parking slot costs an extra 100
+        if owner == -1 or owner == car_index:
+            return 26 - car_index
+        return 100 + 26 - car_index
+
+    # Converts a parking state (with points) to a packed parking state
+    def pack(self, state: ParkingState) -> PackedParkingState:
+        cells = tuple(car.y * self.width + car.x for car in state)
+        occupied = 0
+        for cell in cells:
+            occupied |= 1 << cell
+        return cells, occupied
+
+    # Converts a packed parking state back to a parking state (with points)
+    def unpack(self, state: PackedParkingState) -> ParkingState:
+        return tuple(Point(cell % self.width, cell // self.width) for cell in state[0])
+
+    def convert_state_to_grid(self, state: PackedParkingState) -> List[List[str]]:
+        return self.source.convert_state_to_grid(self.unpack(state))
+
+    # Create a packed parking problem from a parking problem
+    @staticmethod
+    def from_problem(source: ParkingProblem) -> 'PackedParkingProblem':
+        problem = PackedParkingProblem()
+        problem.source = source
+        problem.width = width = source.width
+        problem.offsets = {direction: direction.to_vector().x + direction.to_vector().y * width for direction in Direction}
+        neighbors = []
+        for cell in range(width * source.height):
+            position = Point(cell % width, cell // width)
+            neighbors.append(tuple(
+                (direction, cell + problem.offsets[direction]) for direction in Direction
+                if position in source.passages and position + direction.to_vector() in source.passages
+            ))
+        problem.neighbors = tuple(neighbors)
+        slot_owners = [-1] * (width * source.height)
+        for position, car_index in source.slots.items():
+            slot_owners[position.y * width + position.x] = car_index
+        problem.slot_owners = tuple(slot_owners)
+        slots = {car_index: position.y * width + position.x for position, car_index in source.slots.items()}
+        car_count = len(source.cars)
+        problem.goal = tuple(slots[i] for i in range(car_count)) if all(i in slots for i in range(car_count)) else None
+        problem.initial_state = problem.pack(source.cars)
+        return problem
+
+    # Read a packed parking problem from text containing a grid of tiles
+    @staticmethod
+    def from_text(text: str) -> 'PackedParkingProblem':
+        return PackedParkingProblem.from_problem(ParkingProblem.from_text(text))
+
+    # Read a packed parking problem from file containing a grid of tiles
+    @staticmethod
+    def from_file(path: str) -> 'PackedParkingProblem':
+        return PackedParkingProblem.from_problem(ParkingProblem.from_file(path))
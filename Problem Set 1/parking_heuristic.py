@@ -0,0 +1,101 @@
+from array import array
+from typing import Dict, List, Sequence, Tuple
+import heapq
+
+from parking import ParkingProblem, ParkingState, PackedParkingProblem, PackedParkingState
+from mathutils import Direction, Point
+
+# This file contains a pattern database heuristic for the parking problem.
+# Every action moves a single car and its cost depends only on that car and the cell it enters,
+# so if the cars are split into disjoint groups, the exact cost for each group to park (while ignoring the cars outside it)
+# is a lower bound of the group's share of the total cost. Thus, the sum of the group costs is admissible (and consistent).
+# Each table is indexed by the flat cell indices (y * width + x) of the group's cars and is computed once per park layout
+# using a backward Dijkstra search from the configuration where every car of the group is in its slot.
+
+class ParkingPatternDatabase:
+    __slots__ = ("width", "groups", "tables", "cell_count")
+
+    width: int # The width of the park (used to compute the flat cell indices)
+    cell_count: int # The number of cells in the park (the base of the group indices)
+    groups: List[Tuple[int, ...]] # The car indices in each group
+    tables: List[array] # The cost of each group to park, indexed by the positions of the group's cars
+
+    def __init__(self, problem: ParkingProblem, group_size: int = 2) -> None:
+        self.width = problem.width
+        self.cell_count = problem.width * problem.height
+        car_count = len(problem.cars)
+        self.groups = [tuple(range(start, min(start + group_size, car_count))) for start in range(0, car_count, group_size)]
+        # Compute the neighbors of each passage once for all the groups
+        neighbors: Dict[int, List[int]] = {}
+        for position in problem.passages:
+            adjacent = (position + direction.to_vector() for direction in Direction)
+            neighbors[self.index(position)] = [self.index(point) for point in adjacent if point in problem.passages]
+        slots = {self.index(position): car for position, car in problem.slots.items()}
+        self.tables = [self._build_table(problem, group, neighbors, slots) for group in self.groups]
+
+    # Returns the pattern database of the problem (it is built once and stored in the problem's cache)
+    @staticmethod
+    def of(problem: ParkingProblem, group_size: int = 2) -> 'ParkingPatternDatabase':
+        key = ("parking_pattern_database", group_size)
+        database = problem.cache().get(key)
+        if database is None:
+            database = problem.cache()[key] = ParkingPatternDatabase(problem, group_size)
+        return database
+
+    def index(self, position: Point) -> int:
+        return position.y * self.width + position.x
+
+    # Returns the index of a group configuration in its table
+    def group_index(self, cells: Sequence[int]) -> int:
+        index = 0
+        for cell in reversed(cells):
+            index = index * self.cell_count + cell
+        return index
+
+    def _build_table(self, problem: ParkingProblem, group: Tuple[int, ...], neighbors: Dict[int, List[int]], slots: Dict[int, int]) -> array:
+        table = array('d', [float('inf')]) * (self.cell_count ** len(group))
+        goals = {car: cell for cell, car in slots.items()}
+        if any(car not in goals for car in group):
+            return table # Some car has no slot so the group can never park
+        # The cost of car 'car' entering the cell 'cell' (same as ParkingProblem.get_cost)
+        def enter_cost(car: int, cell: int) -> float:
+            owner = slots.get(cell)
+            return 26 - car if owner is None or owner == car else 100 + 26 - car
+        goal = tuple(goals[car] for car in group)
+        distances = {goal: 0.0}
+        frontier = [(0.0, goal)]
+        while frontier:
+            distance, cells = heapq.heappop(frontier)
+            if distance > distances[cells]: continue
+            table[self.group_index(cells)] = distance
+            # A predecessor is any configuration where one car was in a neighboring free cell before entering its current cell
+            for k, car in enumerate(group):
+                cell = cells[k]
+                cost = distance + enter_cost(car, cell)
+                for previous in neighbors[cell]:
+                    if previous in cells: continue
+                    predecessor = cells[:k] + (previous,) + cells[k+1:]
+                    if cost < distances.get(predecessor, float('inf')):
+                        distances[predecessor] = cost
+                        heapq.heappush(frontier, (cost, predecessor))
+        return table
+
+    def __call__(self, state: ParkingState) -> float:
+        return self.lookup([self.index(position) for position in state])
+
+    # Returns the sum of the group costs given the cell index of every car
+    def lookup(self, cells: Sequence[int]) -> float:
+        return sum(table[self.group_index([cells[car] for car in group])] for group, table in zip(self.groups, self.tables))
+
+# This heuristic sums the exact cost of every single car to park while ignoring the other cars
+def parking_heuristic(problem: ParkingProblem, state: ParkingState) -> float:
+    return ParkingPatternDatabase.of(problem, 1)(state)
+
+# This heuristic sums the exact cost of every pair of cars to park while ignoring the cars outside the pair
+# It dominates "parking_heuristic" since each pair accounts for the cars in the pair blocking each other
+def parking_pair_heuristic(problem: ParkingProblem, state: ParkingState) -> float:
+    return ParkingPatternDatabase.of(problem, 2)(state)
+
+# The packed states already store the cars as flat cell indices, so the tables (built for the original problem) are indexed directly
+def packed_parking_pair_heuristic(problem: PackedParkingProblem, state: PackedParkingState) -> float:
+    return ParkingPatternDatabase.of(problem.source, 2).lookup(state[0])
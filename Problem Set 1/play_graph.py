@@ -2,11 +2,17 @@ import time
 from graph import GraphRoutingProblem, GraphNode, graphrouting_heuristic
 from agents import HumanAgent, UninformedSearchAgent, InformedSearchAgent
 from helpers.utils import fetch_recorded_calls
-import argparse, os, json
+from search_statistics import SearchStatistics
+from solution_store import SolutionStore
+import argparse, contextlib, os, json
 
 # Create an agent based on the user selections
 def create_agent(args: argparse.Namespace):
     agent_type: str = args.agent
+    heuristic = graphrouting_heuristic
+    if args.landmarks:
+        from graph_landmarks import landmark_heuristic
+        heuristic = landmark_heuristic
     if agent_type == "human":
         # This function reads the action from the user (human)
         def graph_user_action(problem: GraphRoutingProblem, state: GraphNode) -> GraphNode:
@@ -35,19 +41,40 @@ def create_agent(args: argparse.Namespace):
     if agent_type == "ucs":
         from search import UniformCostSearch
         return UninformedSearchAgent(UniformCostSearch)
+    if agent_type == "bibfs":
+        from bidirectional_search import BidirectionalBreadthFirstSearch
+        return UninformedSearchAgent(BidirectionalBreadthFirstSearch)
+    if agent_type == "biucs":
+        from bidirectional_search import BidirectionalUniformCostSearch
+        return UninformedSearchAgent(BidirectionalUniformCostSearch)
     if agent_type == "astar":
         from search import AStarSearch
-        return InformedSearchAgent(AStarSearch, graphrouting_heuristic)
+        return InformedSearchAgent(AStarSearch, heuristic)
+    if agent_type == "idastar":
+        from memory_bounded_search import IterativeDeepeningAStarSearch
+        return InformedSearchAgent(IterativeDeepeningAStarSearch, heuristic)
+    if agent_type == "smastar":
+        from memory_bounded_search import SimplifiedMemoryBoundedAStarSearch
+        return InformedSearchAgent(SimplifiedMemoryBoundedAStarSearch, heuristic)
     if agent_type == "gbfs":
         from search import BestFirstSearch
-        return InformedSearchAgent(BestFirstSearch, graphrouting_heuristic)
+        return InformedSearchAgent(BestFirstSearch, heuristic)
     print(f"Requested Agent '{agent_type}' is invalid")
     exit(-1)
 
 def main(args: argparse.Namespace):
     start = time.time() # Track run time
     graph_path = args.graph
-    problem = GraphRoutingProblem.from_file(graph_path) # create the problem
+    if args.landmarks:
+        # Load the problem with the precomputed landmark tables (see graph_landmarks.py)
+        from graph_landmarks import StaleLandmarksError, load_problem
+        try:
+            problem = load_problem(graph_path)
+        except StaleLandmarksError as error:
+            print(f"{error}, rebuilding it...")
+            problem = load_problem(graph_path, rebuild=True)
+    else:
+        problem = GraphRoutingProblem.from_file(graph_path) # create the problem
     # Check if there is a figure for the graph that we can display on the console
     figure_path = json.load(open(graph_path, 'r')).get("figure")
     figure = None
@@ -61,13 +88,19 @@ def main(args: argparse.Namespace):
         print(figure)
     print("Current Node:", state)
     agent = create_agent(args)
+    # If desired by the user, the solutions are stored on disk so that the next runs with the same options do not search again
+    if args.cache and not isinstance(agent, HumanAgent):
+        agent.store = SolutionStore(args.cache, args.cache_size)
+        agent.config = f"{args.agent}:landmarks={args.landmarks}"
+    # If desired by the user, the statistics of every search run are collected (see search_statistics.py)
+    statistics = SearchStatistics(args.trace_memory) if args.stats else contextlib.nullcontext()
     step = 0 # This will store the current step
     path_cost = 0 # This will store the total path cost
     traversed_nodes = [] # This will store all the traversed nodes in order of traversal
     unsolvable = False # This will store whether the problem is unsolvable or not
     while not problem.is_goal(state):
         fetch_recorded_calls(GraphRoutingProblem.is_goal) # Clear the recorded calls
-        action = agent.act(problem, state) # Request an action from the agent
+        with statistics: action = agent.act(problem, state) # Request an action from the agent
         # Retrieve the traversed nodes
         traversed_nodes += [call["args"][1].name for call in list(fetch_recorded_calls(GraphRoutingProblem.is_goal))]
         # If no solution was found, break
@@ -92,6 +125,10 @@ def main(args: argparse.Namespace):
     # This was a search agent, display the traversed nodes
     if not isinstance(agent, HumanAgent):
         print(f"Traversal Order: {'->'.join(traversed_nodes)}")
+    # Export the collected search statistics
+    if args.stats:
+        statistics.to_json(args.stats)
+        print(f"Search statistics were written to {args.stats}")
     # Finally print the elapsed time for the whole process
     print(f"Elapsed time: {time.time() - start} seconds")
 
@@ -100,8 +137,18 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Play Graph as Human or AI")
     parser.add_argument("graph", help="path to the graph to play")
     parser.add_argument("--agent", "-a", default="human",
-                        choices=['human', 'bfs', 'dfs', 'ucs', 'astar', 'gbfs'],
+                        choices=['human', 'bfs', 'dfs', 'ucs', 'bibfs', 'biucs', 'astar', 'gbfs', 'idastar', 'smastar'],
                         help="the agent that will play the game")
+    parser.add_argument("--landmarks", "-l", action="store_true", default=False,
+                        help="Use the precomputed landmark tables (built by graph_landmarks.py) for the informed agents")
+    parser.add_argument("--cache", "-sc", default=None,
+                        help="a directory in which the solutions are stored and reused across runs")
+    parser.add_argument("--cache-size", "-cs", type=int, default=1024,
+                        help="the maximum number of solutions kept in the cache directory")
+    parser.add_argument("--stats", "-s", default=None,
+                        help="Collect the statistics of the search runs and write them as JSON to the given path")
+    parser.add_argument("--trace-memory", "-tm", action="store_true", default=False,
+                        help="Also measure the peak memory of the search runs when collecting statistics (slow)")
 
     args = parser.parse_args()
     try:
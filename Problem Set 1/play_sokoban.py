@@ -1,10 +1,12 @@
 from typing import List
-from sokoban import SokobanProblem, Direction, SokobanState, SokobanTile
+from sokoban import SokobanProblem, PackedSokobanProblem, Direction, SokobanState, SokobanTile, packed_heuristic
 from agents import HumanAgent, UninformedSearchAgent, InformedSearchAgent
 from helpers.utils import fetch_tracked_call_count
 from helpers.heuristic_checks import test_heuristic_consistency
-from functools import lru_cache
-import argparse, time
+from search_statistics import SearchStatistics
+from solution_store import SolutionStore
+from functools import lru_cache, partial
+import argparse, contextlib, time
 
 def colored_sokoban(level: str):
     from helpers.utils import bcolors
@@ -18,21 +20,34 @@ def colored_sokoban(level: str):
     return level
 
 # Return the heuristic selected by the user
-def get_heuristic(name: str):
+def get_heuristic(name: str, packed: bool = False):
     if name == "zero":
         return lambda *_: 0
     if name == "weak":
         from sokoban_heuristic import weak_heuristic
-        return weak_heuristic
+        return packed_heuristic(weak_heuristic) if packed else weak_heuristic
     if name == "strong":
         from sokoban_heuristic import strong_heuristic
-        return strong_heuristic
+        return packed_heuristic(strong_heuristic) if packed else strong_heuristic
+    if name == "assignment":
+        from sokoban_heuristic import assignment_heuristic
+        return packed_heuristic(assignment_heuristic) if packed else assignment_heuristic
     print(f"Requested Heuristic '{name}' is invalid")
     exit(-1)
 
 # Create an agent based on the user selections
 def create_agent(args: argparse.Namespace):
     agent_type: str = args.agent
+    problem_type = PackedSokobanProblem if args.packed else SokobanProblem
+    # If desired by the user, the search functions solve the problem at the push level and expand the solution to steps
+    wrap = lambda search_fn: search_fn
+    if args.macro:
+        from sokoban_push import SokobanPushProblem, push_level_search
+        problem_type, wrap = SokobanPushProblem, partial(push_level_search, symmetry=args.symmetry)
+    elif args.symmetry:
+        # If desired by the user, the search functions merge the states that are symmetric under the symmetries of the level
+        from sokoban_symmetry import CanonicalSokobanProblem, symmetric_search
+        problem_type, wrap = CanonicalSokobanProblem, symmetric_search
     if agent_type == "human":
         # This function reads the action from the user (human)
         def sokoban_user_action(problem: SokobanProblem, state: SokobanState) -> Direction:
@@ -52,29 +67,40 @@ def create_agent(args: argparse.Namespace):
         return HumanAgent(sokoban_user_action)
     if agent_type == "bfs":
         from search import BreadthFirstSearch
-        return UninformedSearchAgent(BreadthFirstSearch)
+        return UninformedSearchAgent(wrap(BreadthFirstSearch))
     if agent_type == "dfs":
         from search import DepthFirstSearch
-        return UninformedSearchAgent(DepthFirstSearch)
+        return UninformedSearchAgent(wrap(DepthFirstSearch))
     if agent_type == "ucs":
         from search import UniformCostSearch
-        return UninformedSearchAgent(UniformCostSearch)
+        return UninformedSearchAgent(wrap(UniformCostSearch))
     if agent_type == "astar":
         from search import AStarSearch
         # We cache the heuristic calls to speed up the search process if the heuristic is not fast
-        heuristic = lru_cache(2**16)(get_heuristic(args.heuristic))
+        heuristic = lru_cache(2**16)(get_heuristic(args.heuristic, args.packed))
         # If desired by the user, we track every transition and check for the heuristic consistency for each transition
         if args.checks:
-            SokobanProblem.get_successor = test_heuristic_consistency(heuristic)(SokobanProblem.get_successor)
-        return InformedSearchAgent(AStarSearch, heuristic)
+            problem_type.get_successor = test_heuristic_consistency(heuristic)(problem_type.get_successor)
+        return InformedSearchAgent(wrap(AStarSearch), heuristic)
+    if agent_type in ("idastar", "smastar"):
+        from memory_bounded_search import IterativeDeepeningAStarSearch, SimplifiedMemoryBoundedAStarSearch
+        # The memory limit is passed to the search function
+        if agent_type == "idastar":
+            search_fn = partial(IterativeDeepeningAStarSearch, table_size=args.table_size)
+        else:
+            search_fn = partial(SimplifiedMemoryBoundedAStarSearch, node_budget=args.node_budget)
+        heuristic = get_heuristic(args.heuristic, args.packed)
+        if args.checks:
+            problem_type.get_successor = test_heuristic_consistency(heuristic)(problem_type.get_successor)
+        return InformedSearchAgent(wrap(search_fn), heuristic)
     if agent_type == "gbfs":
         from search import BestFirstSearch
         # We cache the heuristic calls to speed up the search process if the heuristic is not fast
-        heuristic = lru_cache(2**16)(get_heuristic(args.heuristic))
+        heuristic = lru_cache(2**16)(get_heuristic(args.heuristic, args.packed))
         # If desired by the user, we track every transition and check for the heuristic consistency for each transition
         if args.checks:
-            SokobanProblem.get_successor = test_heuristic_consistency(heuristic)(SokobanProblem.get_successor)
-        return InformedSearchAgent(BestFirstSearch, heuristic)
+            problem_type.get_successor = test_heuristic_consistency(heuristic)(problem_type.get_successor)
+        return InformedSearchAgent(wrap(BestFirstSearch), heuristic)
     print(f"Requested Agent '{agent_type}' is invalid")
     exit(-1)
 
@@ -82,24 +108,38 @@ def main(args: argparse.Namespace):
     state_printer = lambda state: print(state)
     if args.ansicolors: state_printer = lambda state: print(colored_sokoban(str(state)))
     start = time.time() # Track run time
-    problem = SokobanProblem.from_file(args.level) # create the problem
+    problem = (PackedSokobanProblem if args.packed else SokobanProblem).from_file(args.level) # create the problem
+    problem.prune_deadlocks = args.prune # If desired by the user, the pushes into deadlocks are not considered
     state = problem.get_initial_state() # Get the initial state
     print("Initial State:")
     state_printer(state)
     agent = create_agent(args)
+    # If desired by the user, the solutions are stored on disk so that the next runs with the same options do not search again
+    if args.cache and not isinstance(agent, HumanAgent):
+        agent.store = SolutionStore(args.cache, args.cache_size)
+        agent.config = f"{args.agent}:{args.heuristic}:packed={args.packed}:prune={args.prune}:macro={args.macro}" \
+                       f":symmetry={args.symmetry}" \
+                       f":table_size={args.table_size}:node_budget={args.node_budget}"
+    # If desired by the user, the statistics of every search run are collected (see search_statistics.py)
+    statistics = SearchStatistics(args.trace_memory) if args.stats else contextlib.nullcontext()
+    # The get_actions calls of the problem that is searched are used to count the explored nodes
+    tracked_get_actions = type(problem).get_actions
+    if args.macro:
+        from sokoban_push import SokobanPushProblem
+        tracked_get_actions = SokobanPushProblem.get_actions
     step = 0 # This will store the current step
     total_explored_nodes = 0 # This will store the number of traversed nodes during search
     unsolvable = False # This will store whether the problem is unsolvable or not
     while not problem.is_goal(state):
-        fetch_tracked_call_count(SokobanProblem.is_goal) # Clear the call counter
-        action = agent.act(problem, state) # Request an action from the agent
+        fetch_tracked_call_count(tracked_get_actions) # Clear the call counter
+        with statistics: action = agent.act(problem, state) # Request an action from the agent
         # If no solution was found, break
         if action is None:
             print("Agent cannot find a solution, exiting...")
             unsolvable = True
             break
         # Get the number of traversed nodes
-        total_explored_nodes += fetch_tracked_call_count(SokobanProblem.is_goal)
+        total_explored_nodes += fetch_tracked_call_count(tracked_get_actions)
         # Apply the action to the state
         state = problem.get_successor(state, action)
         step += 1
@@ -117,6 +157,16 @@ def main(args: argparse.Namespace):
     # This was a search agent, display the number of traversed nodes
     if not isinstance(agent, HumanAgent):
         print(f"Search explored {total_explored_nodes} nodes")
+    # For the memory bounded agents, display the peak number of nodes stored in memory
+    if args.agent in ("idastar", "smastar"):
+        from memory_bounded_search import fetch_memory_bounded_stats
+        memory_stats = fetch_memory_bounded_stats()
+        print(f"Memory bounded search expanded {memory_stats['expanded']} nodes and stored at most {memory_stats['peak_nodes']} nodes"
+              " (the peak memory in bytes is reported by --stats with --trace-memory)")
+    # Export the collected search statistics
+    if args.stats:
+        statistics.to_json(args.stats)
+        print(f"Search statistics were written to {args.stats}")
     # Finally print the elapsed time for the whole process
     print(f"Elapsed time: {time.time() - start} seconds")
 
@@ -126,17 +176,43 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Play Sokoban as Human or AI")
     parser.add_argument("level", help="path to the sokoban level to play")
     parser.add_argument("--agent", "-a", default="human",
-                        choices=['human', 'bfs', 'dfs', 'ucs', 'astar', 'gbfs'],
+                        choices=['human', 'bfs', 'dfs', 'ucs', 'astar', 'gbfs', 'idastar', 'smastar'],
                         help="the agent that will play the game")
     parser.add_argument("--heuristic", '-hf', default="zero",
-                        choices=["zero", "weak", "strong"],
+                        choices=["zero", "weak", "strong", "assignment"],
                         help="choose the heuristic to use with A* or Greedy Best First Search")
+    parser.add_argument("--table-size", "-ts", type=int, default=2**16,
+                        help="the maximum size of the transposition table for IDA*")
+    parser.add_argument("--node-budget", "-nb", type=int, default=2**16,
+                        help="the maximum number of nodes stored in memory for SMA*")
     parser.add_argument("--checks", "-c", action='store_true', default=False,
                         help="Enable consistency checks for the heuristic")
+    parser.add_argument("--packed", "-p", action="store_true", default=False,
+                        help="Use the packed (integer bitboard) states which are faster to search")
+    parser.add_argument("--prune", "-pd", action="store_true", default=False,
+                        help="Do not consider the pushes that lead to a deadlock (not supported with --packed)")
+    parser.add_argument("--macro", "-m", action="store_true", default=False,
+                        help="Search over crate pushes instead of single steps (not supported with --packed)")
+    parser.add_argument("--symmetry", "-sy", action="store_true", default=False,
+                        help="Merge the states that are symmetric under the mirrors and rotations of the level (not supported with --packed)")
+    parser.add_argument("--cache", "-sc", default=None,
+                        help="a directory in which the solutions are stored and reused across runs")
+    parser.add_argument("--cache-size", "-cs", type=int, default=1024,
+                        help="the maximum number of solutions kept in the cache directory")
+    parser.add_argument("--stats", "-s", default=None,
+                        help="Collect the statistics of the search runs and write them as JSON to the given path")
+    parser.add_argument("--trace-memory", "-tm", action="store_true", default=False,
+                        help="Also measure the peak memory of the search runs when collecting statistics (slow)")
     parser.add_argument("--ansicolors", "-ac", action="store_true",
                         help="Print the level on the console with ANSI colors (only works on some terminals)")
 
     args = parser.parse_args()
+    if args.prune and args.packed:
+        parser.error("--prune is not supported with --packed")
+    if args.macro and args.packed:
+        parser.error("--macro is not supported with --packed")
+    if args.symmetry and args.packed:
+        parser.error("--symmetry is not supported with --packed")
     try:
         main(args)
     except KeyboardInterrupt:
@@ -0,0 +1,187 @@
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+import argparse, multiprocessing, os, queue, time
+
+from problem import HeuristicFunction, Problem, S, A, Solution
+
+# This file contains a portfolio solver which races multiple search strategies on the same problem.
+# Each strategy runs in its own worker process (so the problem, the search functions and the heuristics must be picklable,
+# which means that they must be defined at the module level and not be lambdas). At most "max_workers" strategies run
+# at the same time, and the next strategy is started whenever one finishes. The workers send their results to a queue.
+# The portfolio either returns the first valid solution, or the cheapest valid solution found within the time budget.
+# The solutions are validated in the main process by applying them to the problem before they are accepted.
+# Once the portfolio is done, the strategies that are still running are terminated and the pending ones are never started.
+
+# A strategy is a search function (with a heuristic if it is informed) and a name to identify it in the results
+@dataclass(frozen=True)
+class Strategy:
+    name: str
+    search_fn: Callable[..., Solution]
+    heuristic: Optional[HeuristicFunction] = None
+
+@dataclass
+class PortfolioResult:
+    strategy: str # The name of the strategy which found the solution
+    solution: List[A] # The actions of the solution
+    cost: float # The path cost of the solution
+    elapsed: float # The time taken by the strategy to find the solution (in its worker process)
+    finished: Dict[str, float] = field(default_factory=dict) # The time taken by every strategy that finished (even if it failed)
+
+# This function runs in the worker process and returns the solution with the time taken to find it
+def run_strategy(problem: Problem[S, A], initial_state: S, strategy: Strategy):
+    start = time.perf_counter()
+    if strategy.heuristic is None:
+        solution = strategy.search_fn(problem, initial_state)
+    else:
+        solution = strategy.search_fn(problem, initial_state, strategy.heuristic)
+    return solution, time.perf_counter() - start
+
+# This is the entry point of a worker process. It sends (index, solution, elapsed) to the results queue
+# where the solution is None and the elapsed time is NaN if the strategy failed (e.g. it raised an exception)
+def strategy_worker(index: int, problem: Problem[S, A], initial_state: S, strategy: Strategy, results) -> None:
+    try:
+        solution, elapsed = run_strategy(problem, initial_state, strategy)
+    except Exception:
+        solution, elapsed = None, float('nan')
+    results.put((index, solution, elapsed))
+
+# Applies the solution to the problem and returns its path cost (or None if it is not a valid solution)
+def solution_cost(problem: Problem[S, A], initial_state: S, solution: Solution) -> Optional[float]:
+    if solution is None: return None
+    state, cost = initial_state, 0.0
+    try:
+        for action in solution:
+            if action not in problem.get_actions(state): return None
+            cost += problem.get_cost(state, action)
+            state = problem.get_successor(state, action)
+    except Exception:
+        return None
+    return cost if problem.is_goal(state) else None
+
+# Stops the running strategies by terminating their worker processes
+def stop_workers(processes: Dict[int, multiprocessing.Process]) -> None:
+    for process in processes.values():
+        if process.is_alive(): process.terminate()
+    for process in processes.values():
+        process.join()
+
+# Runs the strategies on the problem and returns:
+#   if "first" is True: the first valid solution (the portfolio stops as soon as one is found).
+#   otherwise: the cheapest valid solution found before the time budget runs out (or all the strategies finish).
+# It returns None if no strategy finds a valid solution before the time budget runs out.
+def solve_portfolio(problem: Problem[S, A], strategies: List[Strategy], initial_state: Optional[S] = None,
+                    time_budget: Optional[float] = None, first: bool = True,
+                    max_workers: Optional[int] = None) -> Optional[PortfolioResult]:
+    if initial_state is None:
+        initial_state = problem.get_initial_state()
+    max_workers = max_workers or min(len(strategies), os.cpu_count() or 1)
+    deadline = None if time_budget is None else time.perf_counter() + time_budget
+    results = multiprocessing.Queue()
+    # The running strategies are identified by their indices in the strategy list
+    running: Dict[int, multiprocessing.Process] = {}
+    next_index = 0
+    best: Optional[PortfolioResult] = None
+    finished: Dict[str, float] = {}
+
+    def start_workers() -> None:
+        nonlocal next_index
+        while len(running) < max_workers and next_index < len(strategies):
+            process = multiprocessing.Process(target=strategy_worker, daemon=True,
+                                              args=(next_index, problem, initial_state, strategies[next_index], results))
+            process.start()
+            running[next_index] = process
+            next_index += 1
+
+    def receive(message) -> None:
+        nonlocal best
+        index, solution, elapsed = message
+        running.pop(index).join()
+        strategy = strategies[index]
+        finished[strategy.name] = elapsed
+        cost = solution_cost(problem, initial_state, solution)
+        if cost is not None and (best is None or cost < best.cost):
+            best = PortfolioResult(strategy.name, solution, cost, elapsed)
+
+    try:
+        start_workers()
+        while running:
+            # The queue is polled so that a worker that died without sending its result (e.g. it was killed) is noticed
+            timeout = 0.1 if deadline is None else min(0.1, deadline - time.perf_counter())
+            if timeout <= 0: break # The time budget ran out
+            try:
+                receive(results.get(timeout=timeout))
+            except queue.Empty:
+                dead = [index for index, process in running.items() if process.exitcode is not None]
+                if not dead: continue
+                # A dead worker may have sent its result right before the queue was polled
+                try:
+                    while True: receive(results.get_nowait())
+                except queue.Empty:
+                    pass
+                for index in dead:
+                    if index in running:
+                        running.pop(index).join()
+                        finished[strategies[index].name] = float('nan') # The strategy failed
+            if first and best is not None: break
+            start_workers()
+    finally:
+        stop_workers(running)
+        results.close()
+    if best is not None:
+        best.finished = finished
+    return best
+
+# Returns the problem and the default strategies for the given domain
+def default_portfolio(domain: str, path: str):
+    from search import UniformCostSearch, AStarSearch, BestFirstSearch
+    if domain == "sokoban":
+        from sokoban import SokobanProblem
+        from sokoban_heuristic import strong_heuristic, assignment_heuristic
+        return SokobanProblem.from_file(path), [
+            Strategy("astar-strong", AStarSearch, strong_heuristic),
+            Strategy("astar-assignment", AStarSearch, assignment_heuristic),
+            Strategy("gbfs-strong", BestFirstSearch, strong_heuristic),
+            Strategy("ucs", UniformCostSearch),
+        ]
+    if domain == "parking":
+        from parking import ParkingProblem
+        from parking_heuristic import parking_pair_heuristic
+        return ParkingProblem.from_file(path), [
+            Strategy("astar-parking-pair", AStarSearch, parking_pair_heuristic),
+            Strategy("gbfs-parking-pair", BestFirstSearch, parking_pair_heuristic),
+            Strategy("ucs", UniformCostSearch),
+        ]
+    from graph import GraphRoutingProblem, graphrouting_heuristic
+    return GraphRoutingProblem.from_file(path), [
+        Strategy("astar-graphrouting", AStarSearch, graphrouting_heuristic),
+        Strategy("gbfs-graphrouting", BestFirstSearch, graphrouting_heuristic),
+        Strategy("ucs", UniformCostSearch),
+    ]
+
+def main(args: argparse.Namespace):
+    domain = args.domain or ("graph" if args.path.endswith(".json") else "sokoban")
+    problem, strategies = default_portfolio(domain, args.path)
+    start = time.perf_counter()
+    result = solve_portfolio(problem, strategies, time_budget=args.budget, first=not args.best, max_workers=args.workers)
+    elapsed = time.perf_counter() - start
+    if result is None:
+        print(f"No solution was found in {elapsed:.3f} seconds")
+        return
+    print(f"Strategy '{result.strategy}' found a solution with cost {result.cost} in {result.elapsed:.3f} seconds")
+    format_action = lambda action: f"({', '.join(map(str, action))})" if isinstance(action, tuple) else str(action)
+    print(f"Solution: {' '.join(format_action(action) for action in result.solution)}")
+    for name, time_taken in result.finished.items():
+        print(f"- {name} finished in {time_taken:.3f} seconds")
+    print(f"Elapsed time: {elapsed:.3f} seconds")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Race multiple search strategies on a problem in parallel")
+    parser.add_argument("path", help="path to the sokoban level, the park or the graph")
+    parser.add_argument("--domain", "-d", choices=["sokoban", "parking", "graph"], default=None,
+                        help="the problem type (by default, json files are graphs and other files are sokoban levels)")
+    parser.add_argument("--budget", "-b", type=float, default=None, help="the time budget in seconds")
+    parser.add_argument("--best", action="store_true", default=False,
+                        help="wait for the cheapest solution within the time budget instead of the first solution")
+    parser.add_argument("--workers", "-w", type=int, default=None, help="the number of worker processes")
+    args = parser.parse_args()
+    main(args)
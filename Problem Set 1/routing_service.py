@@ -0,0 +1,220 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+import argparse, asyncio, heapq, json
+
+from graph import GraphNode, GraphRoutingProblem
+from graph_landmarks import StaleLandmarksError, load_problem
+from mathutils import euclidean_distance
+
+# This file contains a long-lived routing engine which loads a graph once and answers many (start, goal) queries,
+# and an asyncio server (with a matching client) that serves the engine over TCP.
+# The engine:
+# 1. Caches the results of the queries with LRU eviction.
+# 2. For sources that appear in multiple queries of the same batch, it builds a full shortest path tree (Dijkstra)
+#    and answers all their queries from it. The trees are also cached with LRU eviction for later batches.
+# 3. For the other queries, it runs A* from the start to the goal (using the landmark tables if they were precomputed).
+# The protocol is line based: each request is a JSON object {"queries": [[start, goal], ...]} in a single line,
+# and each response is a JSON object {"routes": [{"path": [...], "cost": ...} or null, ...]} in a single line.
+
+# A route is the list of node names from the start to the goal (both included) and its cost
+Route = Optional[Tuple[List[str], float]]
+
+# A shortest path tree stores the distance from the source and the parent of every reachable node
+ShortestPathTree = Tuple[Dict[GraphNode, float], Dict[GraphNode, Optional[GraphNode]]]
+
+class RoutingEngine:
+    def __init__(self, problem: GraphRoutingProblem, tree_cache_size: int = 64, result_cache_size: int = 4096) -> None:
+        self.problem = problem
+        self.adjacency = problem.adjacency
+        self.nodes: Dict[str, GraphNode] = {node.name: node for node in problem.adjacency}
+        self.landmarks = problem.cache().get('landmarks')
+        self.tree_cache_size = tree_cache_size
+        self.result_cache_size = result_cache_size
+        self.trees: OrderedDict[GraphNode, ShortestPathTree] = OrderedDict()
+        self.results: OrderedDict[Tuple[str, str], Route] = OrderedDict()
+        self.stats = {"queries": 0, "result_hits": 0, "tree_hits": 0, "trees_built": 0, "searches": 0}
+
+    # Load the graph (and its landmark tables if the side file exists) from file
+    # If the side file is stale, StaleLandmarksError is raised unless "rebuild_landmarks" is True (see "load_problem")
+    @staticmethod
+    def from_file(path: str, rebuild_landmarks: bool = False, **kwargs) -> 'RoutingEngine':
+        return RoutingEngine(load_problem(path, rebuild_landmarks), **kwargs)
+
+    # Answers a batch of (start, goal) queries and returns the routes in the same order
+    def route_batch(self, queries: List[Tuple[str, str]]) -> List[Route]:
+        # Collect the distinct goals per source which are not in the result cache, to decide which sources deserve a full tree
+        # (a repeated query is answered from the result cache after its first search, so it does not count again)
+        sources: Dict[str, Set[str]] = {}
+        for start, goal in queries:
+            if (start, goal) not in self.results:
+                sources.setdefault(start, set()).add(goal)
+        return [self.route(start, goal, len(sources.get(start, ())) > 1) for start, goal in queries]
+
+    # Answers a single query, if build_tree is True, a full shortest path tree is built from the start
+    def route(self, start: str, goal: str, build_tree: bool = False) -> Route:
+        self.stats["queries"] += 1
+        key = (start, goal)
+        if key in self.results:
+            self.stats["result_hits"] += 1
+            self.results.move_to_end(key)
+            return self.results[key]
+        start_node, goal_node = self.nodes.get(start), self.nodes.get(goal)
+        if start_node is None or goal_node is None:
+            result = None
+        else:
+            tree = self.trees.get(start_node)
+            if tree is not None:
+                self.stats["tree_hits"] += 1
+                self.trees.move_to_end(start_node)
+            elif build_tree:
+                tree = self._build_tree(start_node)
+            else:
+                tree = self._search(start_node, goal_node)
+            result = self._extract_route(tree, goal_node)
+        self.results[key] = result
+        if len(self.results) > self.result_cache_size:
+            self.results.popitem(last=False)
+        return result
+
+    # Runs Dijkstra's algorithm from the source until all the reachable nodes are settled and caches the tree
+    def _build_tree(self, source: GraphNode) -> ShortestPathTree:
+        self.stats["trees_built"] += 1
+        tree = self._dijkstra(source, None, lambda _: 0)
+        self.trees[source] = tree
+        if len(self.trees) > self.tree_cache_size:
+            self.trees.popitem(last=False)
+        return tree
+
+    # Runs A* from the source to the goal (the returned partial tree contains the path to the goal)
+    def _search(self, source: GraphNode, goal: GraphNode) -> ShortestPathTree:
+        self.stats["searches"] += 1
+        if self.landmarks is not None:
+            bound = self.landmarks.lower_bound_to(goal)
+            heuristic = lambda node: max(bound(node), euclidean_distance(node.position, goal.position))
+        else:
+            heuristic = lambda node: euclidean_distance(node.position, goal.position)
+        return self._dijkstra(source, goal, heuristic)
+
+    # Dijkstra's algorithm (or A* if a heuristic is given) which stops when the goal is settled (if the goal is not None)
+    # The adjacency is used directly instead of "get_actions" since its calls are recorded
+    def _dijkstra(self, source: GraphNode, goal: Optional[GraphNode], heuristic) -> ShortestPathTree:
+        distances: Dict[GraphNode, float] = {source: 0.0}
+        parents: Dict[GraphNode, Optional[GraphNode]] = {source: None}
+        frontier = [(heuristic(source), 0, source)]
+        settled = set()
+        order = 1
+        get_cost = self.problem.get_cost
+        while frontier:
+            _, _, node = heapq.heappop(frontier)
+            if node in settled: continue
+            settled.add(node)
+            if node == goal: break
+            distance = distances[node]
+            for neighbor in self.adjacency.get(node, []):
+                new_distance = distance + get_cost(node, neighbor)
+                if new_distance < distances.get(neighbor, float('inf')):
+                    distances[neighbor] = new_distance
+                    parents[neighbor] = node
+                    heapq.heappush(frontier, (new_distance + heuristic(neighbor), order, neighbor))
+                    order += 1
+        return distances, parents
+
+    @staticmethod
+    def _extract_route(tree: ShortestPathTree, goal: GraphNode) -> Route:
+        distances, parents = tree
+        if goal not in distances:
+            return None
+        path = []
+        node = goal
+        while node is not None:
+            path.append(node.name)
+            node = parents[node]
+        path.reverse()
+        return path, distances[goal]
+
+# The server answers the requests of each connection in order
+# The engine is not thread-safe, so all the batches run on a single worker thread to keep the event loop responsive
+class RoutingServer:
+    def __init__(self, engine: RoutingEngine) -> None:
+        self.engine = engine
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line: break
+                try:
+                    queries = [(str(start), str(goal)) for start, goal in json.loads(line)["queries"]]
+                    routes = await loop.run_in_executor(self.executor, self.engine.route_batch, queries)
+                    response = {"routes": [None if route is None else {"path": route[0], "cost": route[1]} for route in routes]}
+                except (ValueError, KeyError, TypeError) as err:
+                    response = {"error": f"Invalid request: {err}"}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765) -> asyncio.base_events.Server:
+        return await asyncio.start_server(self.handle, host, port)
+
+class RoutingClient:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+
+    @staticmethod
+    async def connect(host: str = "127.0.0.1", port: int = 8765) -> 'RoutingClient':
+        reader, writer = await asyncio.open_connection(host, port)
+        return RoutingClient(reader, writer)
+
+    async def route_batch(self, queries: List[Tuple[str, str]]) -> List[Optional[Dict]]:
+        self.writer.write(json.dumps({"queries": queries}).encode() + b"\n")
+        await self.writer.drain()
+        response = json.loads(await self.reader.readline())
+        if "error" in response:
+            raise Exception(response["error"])
+        return response["routes"]
+
+    async def close(self) -> None:
+        self.writer.close()
+        await self.writer.wait_closed()
+
+async def serve(args: argparse.Namespace) -> None:
+    try:
+        engine = RoutingEngine.from_file(args.graph)
+    except StaleLandmarksError as error:
+        print(f"{error}, rebuilding it...")
+        engine = RoutingEngine.from_file(args.graph, rebuild_landmarks=True)
+    server = await RoutingServer(engine).serve(args.host, args.port)
+    print(f"Serving {args.graph} on {args.host}:{args.port}")
+    async with server:
+        await server.serve_forever()
+
+async def query(args: argparse.Namespace) -> None:
+    client = await RoutingClient.connect(args.host, args.port)
+    queries = [tuple(item.split(":", 1)) for item in args.queries]
+    for (start, goal), route in zip(queries, await client.route_batch(queries)):
+        if route is None:
+            print(f"{start} -> {goal}: No solution")
+        else:
+            print(f"{start} -> {goal}: {'->'.join(route['path'])} (cost: {route['cost']})")
+    await client.close()
+
+if __name__ == "__main__":
+    # Read the arguments from the command line
+    parser = argparse.ArgumentParser(description="Serve graph routing queries or send queries to a running server")
+    parser.add_argument("--host", default="127.0.0.1", help="the address of the server")
+    parser.add_argument("--port", "-p", type=int, default=8765, help="the port of the server")
+    subparsers = parser.add_subparsers(dest="mode", required=True)
+    serve_parser = subparsers.add_parser("serve", help="load a graph and serve the routing queries")
+    serve_parser.add_argument("graph", help="path to the graph")
+    query_parser = subparsers.add_parser("query", help="send a batch of queries to the server")
+    query_parser.add_argument("queries", nargs="+", help="the queries written as start:goal")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args) if args.mode == "serve" else query(args))
+    except KeyboardInterrupt:
+        print("Goodbye!!")
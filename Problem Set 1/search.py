@@ -1,9 +1,13 @@
 from problem import HeuristicFunction, Problem, S, A, Solution
 from collections import deque
 from helpers.utils import NotImplemented
+from search_statistics import SearchRun, collect_statistics
 
 # TODO: Import any modules you want to use
 import heapq
+from array import array
+from collections import OrderedDict
+from typing import Dict, Generic, List, Set, Tuple
 
 
 # All search functions take a problem and a state
@@ -14,163 +18,342 @@ import heapq
 # 1. A list of actions which represent the path from the initial state to the final state
 # 2. None if there is no solution
 
+# The search tree stores every generated node as a parent index and the action that led to it.
+# This way, a node costs O(1) memory instead of a full copy of its action list,
+# and the path is only rebuilt (by following the parent indices) once a goal is found.
+# Node 0 is always the root (the initial state). Since node indices are assigned in insertion order,
+# they can also be used as the tie breaker in the priority queues.
+class SearchTree(Generic[A]):
+    __slots__ = ("parents", "actions")
+
+    def __init__(self) -> None:
+        self.parents = array('q', [-1])
+        self.actions: List[A] = [None]
+
+    # Returns the number of nodes in the tree (which is also the index that the next added node will get)
+    def __len__(self) -> int:
+        return len(self.actions)
+
+    # Adds a child of the given parent node and returns the index of the new node
+    def add(self, parent: int, action: A) -> int:
+        self.parents.append(parent)
+        self.actions.append(action)
+        return len(self.actions) - 1
+
+    # Returns the list of actions from the root to the given node
+    def path(self, node: int) -> List[A]:
+        path = []
+        parents, actions = self.parents, self.actions
+        while node > 0:
+            path.append(actions[node])
+            node = parents[node]
+        path.reverse()
+        return path
+
+
+# The priority frontier is a binary heap of (priority, node, state, g) entries used by the cost based searches.
+# It remembers the best path cost (g) found so far for every state and uses it to:
+# 1. Reject new entries that are dominated by (no cheaper than) an entry that was already pushed for the same state.
+# 2. Replace an entry if a cheaper path is found: the new entry is pushed and the old one becomes stale (lazy deletion).
+# Stale entries (whose states were already explored) are discarded when they reach the top of the heap
+# and the number of entries discarded by each frontier is stored in "discarded".
+# The class attributes count the rejected pushes, the stale pops and the peak heap size over all frontiers,
+# and can be read and reset using "PriorityFrontier.fetch_stats()".
+class PriorityFrontier(Generic[S]):
+    __slots__ = ("heap", "best", "explored", "discarded")
+
+    rejected_pushes: int = 0
+    stale_pops: int = 0
+    peak_size: int = 0
+
+    def __init__(self, explored: Set[S]) -> None:
+        self.heap: List[Tuple[float, int, S, float]] = []
+        self.best: Dict[S, float] = {}
+        self.explored = explored
+        self.discarded = 0
+
+    # Pushes the state unless it was already reached with a path cost that is less than or equal to g
+    # Returns True if the state was pushed
+    def push(self, priority: float, node: int, state: S, g: float) -> bool:
+        best = self.best.get(state)
+        if best is not None and best <= g:
+            PriorityFrontier.rejected_pushes += 1
+            return False
+        self.best[state] = g
+        heap = self.heap
+        heapq.heappush(heap, (priority, node, state, g))
+        if len(heap) > PriorityFrontier.peak_size:
+            PriorityFrontier.peak_size = len(heap)
+        return True
+
+    # Removes and returns the entry with the least priority (ties are broken by the node index)
+    def pop(self) -> Tuple[float, int, S, float]:
+        return heapq.heappop(self.heap)
+
+    # The frontier is empty if it only contains stale entries, so we discard them before checking
+    def __bool__(self) -> bool:
+        heap, explored = self.heap, self.explored
+        while heap and heap[0][2] in explored:
+            heapq.heappop(heap)
+            PriorityFrontier.stale_pops += 1
+            self.discarded += 1
+        return bool(heap)
+
+    # Returns the number of entries in the heap (including the stale entries)
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    # Returns the statistics collected since the last call and resets them
+    @staticmethod
+    def fetch_stats() -> Dict[str, int]:
+        stats = {
+            "rejected_pushes": PriorityFrontier.rejected_pushes,
+            "stale_pops": PriorityFrontier.stale_pops,
+            "peak_size": PriorityFrontier.peak_size
+        }
+        PriorityFrontier.rejected_pushes = PriorityFrontier.stale_pops = PriorityFrontier.peak_size = 0
+        return stats
+
+
+# The heuristic memo caches the heuristic value of each state so that it is computed once per state
+# instead of once per edge. It has a bounded size and evicts the least recently used states when it is full.
+# A memo is owned by the problem (it is stored in "problem.cache()") so it persists across searches on the same problem,
+# and it counts its hits, misses and evictions which can be read using "stats()" to decide on a good size.
+class HeuristicMemo(Generic[S]):
+    __slots__ = ("problem", "heuristic", "maxsize", "values", "hits", "misses", "evictions")
+
+    def __init__(self, problem: Problem[S, A], heuristic: HeuristicFunction, maxsize: int = 2**16) -> None:
+        self.problem = problem
+        self.heuristic = heuristic
+        self.maxsize = maxsize
+        self.values: OrderedDict[S, float] = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    # Returns the memo of the given heuristic for the given problem (creating it if it does not exist)
+    @staticmethod
+    def of(problem: Problem[S, A], heuristic: HeuristicFunction, maxsize: int = 2**16) -> 'HeuristicMemo[S]':
+        cache = problem.cache()
+        key = ("heuristic_memo", heuristic)
+        memo = cache.get(key)
+        if memo is None:
+            memo = cache[key] = HeuristicMemo(problem, heuristic, maxsize)
+        return memo
+
+    def __call__(self, state: S) -> float:
+        values = self.values
+        value = values.get(state)
+        if value is not None:
+            self.hits += 1
+            values.move_to_end(state)
+            return value
+        self.misses += 1
+        value = self.heuristic(self.problem, state)
+        values[state] = value
+        if len(values) > self.maxsize:
+            values.popitem(last=False)
+            self.evictions += 1
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.values),
+            "maxsize": self.maxsize
+        }
+
+
+@collect_statistics
 def BreadthFirstSearch(problem: Problem[S, A], initial_state: S) -> Solution:
     # TODO: ADD YOUR CODE HERE
-    # frontier is a queue of (state, actions) tuples
+    # tree stores the parent and action of every generated node
+    tree = SearchTree()
+    # frontier is a queue of (state, node) tuples
     frontier = deque()
-    frontier.append((initial_state, []))
+    frontier.append((initial_state, 0))
     # explored is a set of states
     explored = set()
+    # If statistics are being collected, the problem reports its calls to the active run
+    run = SearchRun.current()
+    if run is not None:
+        problem = run.watch(problem, frontier, explored)
     while frontier:
         # Get the first element from the frontier
-        (state, parent_actions) = frontier.popleft()
+        (state, node) = frontier.popleft()
         # Check if the state has been explored before
         if state in explored:
+            if run is not None: run.duplicates += 1
             continue
         # Add the state to the explored set
         explored.add(state)
         # Get the actions that can be applied to the current state
         actions = problem.get_actions(state)
         for action in actions:
-            current_child_actions = parent_actions.copy()
-            current_child_actions.append(action)
+            child = tree.add(node, action)
             # Get the next state by applying the action to the current state
             next_state = problem.get_successor(state, action)
             # Check if the next state is the goal state
             if problem.is_goal(next_state):
-                return current_child_actions
+                return tree.path(child)
             # Add the next state to the frontier
-            frontier.append((next_state, current_child_actions))
+            frontier.append((next_state, child))
     return None
 
 
+@collect_statistics
 def DepthFirstSearch(problem: Problem[S, A], initial_state: S) -> Solution:
     # TODO: ADD YOUR CODE HERE
-    # frontier is a stack of (state, actions) tuples
+    # tree stores the parent and action of every generated node
+    tree = SearchTree()
+    # frontier is a stack of (state, node) tuples
     frontier = deque()
-    frontier.append((initial_state, []))
+    frontier.append((initial_state, 0))
     # explored is a set of states
     explored = set()
+    # If statistics are being collected, the problem reports its calls to the active run
+    run = SearchRun.current()
+    if run is not None:
+        problem = run.watch(problem, frontier, explored)
     while frontier:
         # Get the first element from the frontier
-        (state, parent_actions) = frontier.pop()
+        (state, node) = frontier.pop()
         # Check if the state has been explored before
         if state in explored:
+            if run is not None: run.duplicates += 1
             continue
         # Add the state to the explored set
         explored.add(state)
         # Check if the state is the goal state
         if problem.is_goal(state):
-            return parent_actions
+            return tree.path(node)
         # Get the actions that can be applied to the current state
         actions = problem.get_actions(state)
         for action in actions:
-            current_child_actions = parent_actions.copy()
-            current_child_actions.append(action)
+            child = tree.add(node, action)
             # Get the next state by applying the action to the current state
             next_state = problem.get_successor(state, action)
             # Add the next state to the frontier
-            frontier.append((next_state, current_child_actions))
+            frontier.append((next_state, child))
     return None
 
 
+@collect_statistics
 def UniformCostSearch(problem: Problem[S, A], initial_state: S) -> Solution:
     # TODO: ADD YOUR CODE HERE
-    # frontier is a priority queue of (cost, state, actions) tuples
-    frontier = []
-    order = 1  # To prevent comparing states (Which causes an error) and to make sure that the order of the states is correct
-    heapq.heappush(frontier, (0, 0, initial_state, []))
+    # tree stores the parent and action of every generated node
+    tree = SearchTree()
     # explored is a set of states
     explored = set()
+    # frontier is a priority queue of (cost, node, state, cost) tuples that skips the explored states
+    # The node index prevents comparing states (Which causes an error) and makes sure that the order of the states is correct
+    frontier = PriorityFrontier(explored)
+    # If statistics are being collected, the problem reports its calls to the active run
+    run = SearchRun.current()
+    if run is not None:
+        problem = run.watch(problem, frontier, explored)
+    frontier.push(0, 0, initial_state, 0)
     while frontier:
         # Get the first element from the frontier
-        (cost, _id, state, parent_actions) = heapq.heappop(frontier)
-        # Check if the state has been explored before
-        if state in explored:
-            continue
+        (cost, node, state, _) = frontier.pop()
         # Add the state to the explored set
         explored.add(state)
         # Check if the state is the goal state
         if problem.is_goal(state):
-            return parent_actions
+            return tree.path(node)
         # Get the actions that can be applied to the current state
         actions = problem.get_actions(state)
         for action in actions:
-            current_child_actions = parent_actions.copy()
-            current_child_actions.append(action)
             # Get the next state by applying the action to the current state
             next_state = problem.get_successor(state, action)
-            # Add the next state to the frontier
-            heapq.heappush(frontier, (cost + problem.get_cost(state, action), order, next_state, current_child_actions))
-            # Increment the order
-            order += 1
+            next_cost = cost + problem.get_cost(state, action)
+            # Add the next state to the frontier unless it was already reached with a lower or equal cost
+            if frontier.push(next_cost, len(tree), next_state, next_cost):
+                tree.add(node, action)
+            elif run is not None:
+                run.duplicates += 1
     return None
 
 
+@collect_statistics
 def AStarSearch(problem: Problem[S, A], initial_state: S, heuristic: HeuristicFunction) -> Solution:
     # TODO: ADD YOUR CODE HERE
-    # frontier is a priority queue of (cost, state, actions) tuples
-    frontier = []
-    order = 1  # To prevent comparing states (Which causes an error) and to make sure that the order of insertion is preserved
-    heapq.heappush(frontier, (heuristic(problem, initial_state), 0, initial_state, []))
+    # tree stores the parent and action of every generated node
+    tree = SearchTree()
     # explored is a set of states
     explored = set()
+    # frontier is a priority queue of (f, node, state, g) tuples that skips the explored states
+    # The node index prevents comparing states (Which causes an error) and makes sure that the order of insertion is preserved
+    frontier = PriorityFrontier(explored)
+    # h caches the heuristic values so that each state is evaluated once
+    h = HeuristicMemo.of(problem, heuristic)
+    # If statistics are being collected, the problem reports its calls to the active run
+    run = SearchRun.current()
+    if run is not None:
+        problem = run.watch(problem, frontier, explored)
+        h = run.timed(h)
+    frontier.push(h(initial_state), 0, initial_state, 0)
     while frontier:
         # Get the first element from the frontier
-        (cost, _id, state, parent_actions) = heapq.heappop(frontier)
-        # Check if the state has been explored before
-        if state in explored:
-            continue
+        (cost, node, state, g) = frontier.pop()
         # Add the state to the explored set
         explored.add(state)
         # Check if the state is the goal state
         if problem.is_goal(state):
-            return parent_actions
+            return tree.path(node)
+        h_state = h(state)
         # Get the actions that can be applied to the current state
         actions = problem.get_actions(state)
         for action in actions:
-            current_child_actions = parent_actions.copy()
-            current_child_actions.append(action)
             # Get the next state by applying the action to the current state
             next_state = problem.get_successor(state, action)
-            # Add the next state to the frontier
-            heapq.heappush(frontier, (
-                heuristic(problem, next_state) - heuristic(problem, state) + cost + problem.get_cost(state, action),
-                order, next_state,
-                current_child_actions))
-            # Increment the order
-            order += 1
+            step_cost = problem.get_cost(state, action)
+            # Add the next state to the frontier unless it was already reached with a lower or equal cost
+            if frontier.push(
+                    h(next_state) - h_state + cost + step_cost,
+                    len(tree), next_state, g + step_cost):
+                tree.add(node, action)
+            elif run is not None:
+                run.duplicates += 1
     return None
 
 
+@collect_statistics
 def BestFirstSearch(problem: Problem[S, A], initial_state: S, heuristic: HeuristicFunction) -> Solution:
     # TODO: ADD YOUR CODE HERE
-    # frontier is a priority queue of (cost, state, actions) tuples
+    # tree stores the parent and action of every generated node
+    tree = SearchTree()
+    # frontier is a priority queue of (cost, node, state) tuples
+    # The node index prevents comparing states (Which causes an error) and makes sure that the order of insertion is preserved
     frontier = []
-    order = 1  # To prevent comparing states (Which causes an error) and to make sure that the order of insertion is preserved
-    heapq.heappush(frontier, (0.0, 0, initial_state, []))
+    heapq.heappush(frontier, (0.0, 0, initial_state))
+    # h caches the heuristic values so that each state is evaluated once
+    h = HeuristicMemo.of(problem, heuristic)
     # explored is a set of states
     explored = set()
+    # If statistics are being collected, the problem reports its calls to the active run
+    run = SearchRun.current()
+    if run is not None:
+        problem = run.watch(problem, frontier, explored)
+        h = run.timed(h)
     while frontier:
         # Get the first element from the frontier
-        (cost, _id, state, parent_actions) = heapq.heappop(frontier)
+        (cost, node, state) = heapq.heappop(frontier)
         # Check if the state has been explored before
         if state in explored:
+            if run is not None: run.duplicates += 1
             continue
         # Add the state to the explored set
         explored.add(state)
         # Check if the state is the goal state
         if problem.is_goal(state):
-            return parent_actions
+            return tree.path(node)
         # Get the actions that can be applied to the current state
         actions = problem.get_actions(state)
         for action in actions:
-            current_child_actions = parent_actions.copy()
-            current_child_actions.append(action)
+            child = tree.add(node, action)
             # Get the next state by applying the action to the current state
             next_state = problem.get_successor(state, action)
             # Add the next state to the frontier
-            heapq.heappush(frontier, (heuristic(problem, next_state), order, next_state, current_child_actions))
-            # Increment the order
-            order += 1
+            heapq.heappush(frontier, (h(next_state), child, next_state))
     return None
@@ -0,0 +1,205 @@
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+import argparse, glob, json, multiprocessing, platform, queue, statistics, sys, time
+
+from problem import HeuristicFunction, Problem
+from sokoban import SokobanProblem
+from parking import ParkingProblem
+from graph import GraphRoutingProblem, graphrouting_heuristic
+from sokoban_heuristic import weak_heuristic, strong_heuristic
+from parking_heuristic import parking_heuristic, parking_pair_heuristic
+from search import BreadthFirstSearch, DepthFirstSearch, UniformCostSearch, AStarSearch, BestFirstSearch
+from search_statistics import SearchStatistics
+from helpers.utils import fetch_recorded_calls
+
+# This benchmark runs every search function with every heuristic on the sokoban levels, the parks and the graphs.
+# For each case, it measures:
+# 1. The wall time over repeated runs (the median and the variance are reported).
+# 2. The expansions, generated nodes and the peak memory from one extra run with the statistics collector.
+# Each run uses a freshly loaded problem so that no cached data (e.g. the heuristic memo) is shared between runs.
+# Each case is measured in its own process, which is terminated if the case does not finish within the timeout
+# (since the search functions cannot be interrupted otherwise). Such a case is reported as timed out.
+# The results can be saved as a baseline and later runs can be compared against it to flag the regressions.
+
+# The uninformed and the informed search functions
+UNINFORMED_SEARCHES = {"bfs": BreadthFirstSearch, "dfs": DepthFirstSearch, "ucs": UniformCostSearch}
+INFORMED_SEARCHES = {"astar": AStarSearch, "gbfs": BestFirstSearch}
+
+# A domain is a problem type with its problem files and heuristics
+@dataclass(frozen=True)
+class Domain:
+    load: Callable[[str], Problem]
+    pattern: str
+    heuristics: Dict[str, HeuristicFunction]
+
+DOMAINS = {
+    "sokoban": Domain(SokobanProblem.from_file, "levels/*.txt", {"weak": weak_heuristic, "strong": strong_heuristic}),
+    "parking": Domain(ParkingProblem.from_file, "parks/*.txt", {"parking": parking_heuristic, "parking_pair": parking_pair_heuristic}),
+    "graph": Domain(GraphRoutingProblem.from_file, "graphs/*.json", {"graphrouting": graphrouting_heuristic}),
+}
+
+# A benchmark case is a search function (with a heuristic if it is informed) on a problem file
+@dataclass(frozen=True)
+class BenchmarkCase:
+    domain: str
+    path: str
+    search: str
+    heuristic: Optional[str] = None
+
+    @property
+    def key(self) -> str:
+        return f"{self.domain}:{self.path}:{self.search}" + (f":{self.heuristic}" if self.heuristic else "")
+
+    # Loads a fresh problem and runs the search on it
+    def run(self) -> Optional[List[Any]]:
+        domain = DOMAINS[self.domain]
+        problem = domain.load(self.path)
+        if self.heuristic is None:
+            solution = UNINFORMED_SEARCHES[self.search](problem, problem.get_initial_state())
+        else:
+            solution = INFORMED_SEARCHES[self.search](problem, problem.get_initial_state(), domain.heuristics[self.heuristic])
+        # The graph routing problem records every get_actions call, so we clear them to avoid growing memory
+        fetch_recorded_calls(GraphRoutingProblem.get_actions)
+        return solution
+
+# Returns all the cases whose keys contain all the given filters
+def collect_cases(filters: List[str]) -> List[BenchmarkCase]:
+    cases = []
+    for name, domain in DOMAINS.items():
+        for path in sorted(glob.glob(domain.pattern)):
+            for search in UNINFORMED_SEARCHES:
+                cases.append(BenchmarkCase(name, path, search))
+            for search in INFORMED_SEARCHES:
+                for heuristic in domain.heuristics:
+                    cases.append(BenchmarkCase(name, path, search, heuristic))
+    return [case for case in cases if all(text in case.key for text in filters)]
+
+# Runs the case "repeats" times (or only once if the first run takes longer than "max_time" seconds)
+# then runs it once more with the statistics collector
+def measure(case: BenchmarkCase, repeats: int, max_time: float, trace_memory: bool) -> Dict[str, Any]:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        case.run()
+        times.append(time.perf_counter() - start)
+        if times[-1] > max_time: break
+    with SearchStatistics(trace_memory) as collector:
+        case.run()
+    run = collector.runs[-1]
+    return {
+        "times": times,
+        "time_median": statistics.median(times),
+        "time_variance": statistics.variance(times) if len(times) > 1 else 0.0,
+        "expansions": run.expansions,
+        "generated": run.generated,
+        "solution_length": run.solution_length,
+        "peak_memory": run.peak_memory
+    }
+
+# This is the entry point of the process that measures a case, it sends (result, error) to the results queue
+def measure_worker(case: BenchmarkCase, repeats: int, max_time: float, trace_memory: bool, results) -> None:
+    try:
+        results.put((measure(case, repeats, max_time, trace_memory), None))
+    except Exception as error:
+        results.put((None, error))
+
+# Measures the case in a separate process and returns the result
+# or {"timed_out": True} if the case does not finish within "timeout" seconds (a timeout of 0 means no limit)
+def measure_with_timeout(case: BenchmarkCase, repeats: int, max_time: float, trace_memory: bool, timeout: float) -> Dict[str, Any]:
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=measure_worker, daemon=True, args=(case, repeats, max_time, trace_memory, results))
+    process.start()
+    deadline = time.perf_counter() + timeout if timeout > 0 else float('inf')
+    try:
+        while True:
+            # The queue is polled so that a process that died without sending its result is noticed
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return {"timed_out": True}
+            try:
+                result, error = results.get(timeout=min(0.1, remaining))
+                break
+            except queue.Empty:
+                if process.exitcode is not None and results.empty():
+                    raise Exception(f"The process that measured {case.key} exited with code {process.exitcode}")
+    finally:
+        if process.is_alive(): process.terminate()
+        process.join()
+        results.close()
+    if error is not None: raise error
+    return result
+
+# Compares the results against the baseline and returns a message for every regression
+# A case regresses if its median time grows by more than the tolerance (and by more than "min_delta" seconds
+# since the very short runs are dominated by noise), if it expands more nodes,
+# if its peak memory grows by more than the tolerance or if its solution length changes
+# A case that timed out regresses unless it also timed out in the baseline
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float, min_delta: float) -> List[str]:
+    regressions = []
+    for key, result in results.items():
+        reference = baseline.get(key)
+        if reference is None or reference.get("timed_out"): continue
+        if result.get("timed_out"):
+            regressions.append(f"{key}: timed out (median time was {reference['time_median']:.4f}s)")
+            continue
+        if result["time_median"] > max(reference["time_median"] * (1 + tolerance), reference["time_median"] + min_delta):
+            regressions.append(f"{key}: median time {reference['time_median']:.4f}s -> {result['time_median']:.4f}s")
+        if result["expansions"] > reference["expansions"]:
+            regressions.append(f"{key}: expansions {reference['expansions']} -> {result['expansions']}")
+        if result["peak_memory"] is not None and reference.get("peak_memory") is not None \
+                and result["peak_memory"] > reference["peak_memory"] * (1 + tolerance):
+            regressions.append(f"{key}: peak memory {reference['peak_memory']} -> {result['peak_memory']} bytes")
+        if result["solution_length"] != reference["solution_length"]:
+            regressions.append(f"{key}: solution length {reference['solution_length']} -> {result['solution_length']}")
+    return regressions
+
+def main(args: argparse.Namespace):
+    cases = collect_cases(args.filter)
+    results: Dict[str, Dict[str, Any]] = {}
+    print(f"{'Case':<56} {'Median (s)':>11} {'Variance':>10} {'Expanded':>9} {'Memory (KB)':>12}")
+    for case in cases:
+        result = results[case.key] = measure_with_timeout(case, args.repeats, args.max_time, not args.skip_memory, args.timeout)
+        if result.get("timed_out"):
+            print(f"{case.key:<56} {'timed out':>11}")
+            continue
+        memory = "-" if result["peak_memory"] is None else f"{result['peak_memory'] / 1024:.0f}"
+        print(f"{case.key:<56} {result['time_median']:>11.4f} {result['time_variance']:>10.2e} {result['expansions']:>9} {memory:>12}")
+    if args.save:
+        report = {
+            "python": platform.python_version(),
+            "repeats": args.repeats,
+            "timeout": args.timeout,
+            "results": results
+        }
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=4)
+        print(f"Results were written to {args.save}")
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance, args.min_delta)
+        if regressions:
+            print(f"Found {len(regressions)} regressions against {args.baseline}:")
+            for regression in regressions:
+                print(f"- {regression}")
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the search functions on the sokoban levels, the parks and the graphs")
+    parser.add_argument("filter", nargs="*", help="only run the cases whose keys (domain:path:search[:heuristic]) contain all these texts")
+    parser.add_argument("--repeats", "-r", type=int, default=5, help="the number of timed runs per case")
+    parser.add_argument("--max-time", "-mt", type=float, default=5.0,
+                        help="a case is not repeated if its first run takes more than this number of seconds")
+    parser.add_argument("--timeout", "-to", type=float, default=120.0,
+                        help="a case is stopped and reported as timed out if it takes more than this number of seconds (0 means no limit)")
+    parser.add_argument("--skip-memory", "-sm", action="store_true", default=False,
+                        help="do not measure the peak memory (tracing the memory makes the statistics run much slower)")
+    parser.add_argument("--save", "-s", default=None, help="write the results as JSON to the given path (e.g. to use it as a baseline)")
+    parser.add_argument("--baseline", "-b", default=None, help="compare the results against a JSON file written by --save")
+    parser.add_argument("--tolerance", "-t", type=float, default=0.2,
+                        help="the relative increase in time or memory that is considered a regression")
+    parser.add_argument("--min-delta", "-md", type=float, default=1e-3,
+                        help="the minimum increase in the median time (in seconds) that is considered a regression")
+    args = parser.parse_args()
+    main(args)
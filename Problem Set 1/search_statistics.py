@@ -0,0 +1,181 @@
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+import functools, json, time, tracemalloc
+
+from problem import Problem, S, A
+
+# This file contains a statistics collector for the search functions.
+# While a collector is active (inside a "with SearchStatistics() as stats:" block), every call to a search function
+# decorated with "@collect_statistics" adds a run to the collector with:
+# 1. The number of expansions, generated nodes and duplicate hits (nodes whose states were already reached or explored).
+# 2. The maximum frontier size and the peak explored set size.
+# 3. The time spent in successor generation (get_actions, get_successor and get_cost), heuristic calls and goal tests.
+#    The rest of the run time is spent in the queue operations and the search bookkeeping.
+# 4. The peak traced memory (only if the collector was created with trace_memory=True since tracing is slow).
+# The active collector and run are stored in context variables, so each thread (and asyncio task) has its own collector.
+# When no collector is active, a search function only pays for one context variable lookup per call.
+
+class SearchRun:
+    __slots__ = ("name", "expansions", "generated", "duplicates", "max_frontier", "peak_explored",
+                 "successor_time", "heuristic_time", "goal_time", "total_time", "peak_memory",
+                 "solution_length", "frontier", "explored")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.expansions = self.generated = self.duplicates = self.max_frontier = self.peak_explored = 0
+        self.successor_time = self.heuristic_time = self.goal_time = self.total_time = 0.0
+        self.peak_memory: Optional[int] = None
+        self.solution_length: Optional[int] = None
+        self.frontier = self.explored = None
+
+    # Returns the active run (or None if there is no active collector)
+    @staticmethod
+    def current() -> Optional['SearchRun']:
+        return active_run.get()
+
+    # Registers the frontier and the explored set of the search (used to sample their sizes)
+    # and returns a problem which reports its calls to this run
+    def watch(self, problem: Problem[S, A], frontier: Any, explored: Any) -> 'InstrumentedProblem':
+        self.frontier, self.explored = frontier, explored
+        return InstrumentedProblem(problem, self)
+
+    # Returns a heuristic (of a single argument, e.g. a HeuristicMemo) which reports its calls to this run
+    def timed(self, heuristic: Callable[[S], float]) -> Callable[[S], float]:
+        def timed_heuristic(state: S) -> float:
+            start = time.perf_counter()
+            value = heuristic(state)
+            self.heuristic_time += time.perf_counter() - start
+            return value
+        return timed_heuristic
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "expansions": self.expansions,
+            "generated": self.generated,
+            "duplicates": self.duplicates,
+            "max_frontier": self.max_frontier,
+            "peak_explored": self.peak_explored,
+            "solution_length": self.solution_length,
+            "total_time": self.total_time,
+            "successor_time": self.successor_time,
+            "heuristic_time": self.heuristic_time,
+            "goal_time": self.goal_time,
+            "queue_time": max(0.0, self.total_time - self.successor_time - self.heuristic_time - self.goal_time),
+            "nodes_per_second": self.expansions / self.total_time if self.total_time > 0 else 0.0,
+            "peak_memory": self.peak_memory
+        }
+
+
+# The instrumented problem forwards every call to the original problem and reports it to the run
+# Any other attribute (e.g. the layout or the cache) is read from the original problem
+class InstrumentedProblem:
+    __slots__ = ("problem", "run")
+
+    def __init__(self, problem: Problem[S, A], run: SearchRun) -> None:
+        self.problem = problem
+        self.run = run
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.problem, name)
+
+    def get_actions(self, state: S):
+        run = self.run
+        run.expansions += 1
+        if run.frontier is not None and len(run.frontier) > run.max_frontier:
+            run.max_frontier = len(run.frontier)
+        start = time.perf_counter()
+        actions = self.problem.get_actions(state)
+        run.successor_time += time.perf_counter() - start
+        return actions
+
+    def get_successor(self, state: S, action: A) -> S:
+        run = self.run
+        run.generated += 1
+        start = time.perf_counter()
+        successor = self.problem.get_successor(state, action)
+        run.successor_time += time.perf_counter() - start
+        return successor
+
+    def get_cost(self, state: S, action: A) -> float:
+        start = time.perf_counter()
+        cost = self.problem.get_cost(state, action)
+        self.run.successor_time += time.perf_counter() - start
+        return cost
+
+    def is_goal(self, state: S) -> bool:
+        start = time.perf_counter()
+        goal = self.problem.is_goal(state)
+        self.run.goal_time += time.perf_counter() - start
+        return goal
+
+
+class SearchStatistics:
+    __slots__ = ("runs", "trace_memory", "token")
+
+    def __init__(self, trace_memory: bool = False) -> None:
+        self.runs: List[SearchRun] = []
+        self.trace_memory = trace_memory
+        self.token = None
+
+    def __enter__(self) -> 'SearchStatistics':
+        self.token = active_collector.set(self)
+        return self
+
+    def __exit__(self, *_) -> None:
+        active_collector.reset(self.token)
+
+    # Returns the active collector (or None if there is no active collector)
+    @staticmethod
+    def current() -> Optional['SearchStatistics']:
+        return active_collector.get()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"runs": [run.to_dict() for run in self.runs]}
+
+    def to_json(self, path: Optional[str] = None) -> str:
+        text = json.dumps(self.to_dict(), indent=4)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(text)
+        return text
+
+
+active_collector: ContextVar[Optional[SearchStatistics]] = ContextVar("active_collector", default=None)
+active_run: ContextVar[Optional[SearchRun]] = ContextVar("active_run", default=None)
+
+
+# This decorator adds a run to the active collector (if any) for each call of the search function
+def collect_statistics(search_fn):
+    @functools.wraps(search_fn)
+    def collected(problem, initial_state, *args, **kwargs):
+        collector = active_collector.get()
+        if collector is None:
+            return search_fn(problem, initial_state, *args, **kwargs)
+        run = SearchRun(search_fn.__name__)
+        token = active_run.set(run)
+        tracing = collector.trace_memory
+        if tracing:
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing: tracemalloc.start()
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            solution = search_fn(problem, initial_state, *args, **kwargs)
+        finally:
+            run.total_time = time.perf_counter() - start
+            if tracing:
+                run.peak_memory = tracemalloc.get_traced_memory()[1] - baseline
+                if started_tracing: tracemalloc.stop()
+            active_run.reset(token)
+            if run.explored is not None:
+                run.peak_explored = len(run.explored)
+            # Stale entries discarded by a priority frontier are duplicates too
+            run.duplicates += getattr(run.frontier, "discarded", 0)
+            # Release the search data
+            run.frontier = run.explored = None
+            collector.runs.append(run)
+        run.solution_length = None if solution is None else len(solution)
+        return solution
+    return collected
@@ -1,9 +1,10 @@
+from collections import deque
 from dataclasses import dataclass
-from typing import FrozenSet, Iterable
+from typing import Dict, FrozenSet, Iterable, Optional, Set, Tuple
 from enum import Enum
 
 from mathutils import Direction, Point
-from problem import Problem
+from problem import HeuristicFunction, Problem
 from helpers.utils import track_call_count
 
 # This file contains the definition for the Sokoban problem
@@ -26,13 +27,52 @@ class SokobanTile(str, Enum):
 # we only need the default equality which compares objects by pointers.
 # The layout contains the problem details that are unchangeable across states such as:
 #   The walkable area (locations without walls) and the locations of the goals
+# It also contains lookup tables that are computed once (using "SokobanLayout.build") for every walkable cell:
+#   neighbors[cell][direction] is the walkable cell next to it in that direction (or None if it is a wall)
+#   push_targets[cell][direction] is the walkable cell two steps away in that direction where a crate next to the cell
+#   would be pushed (or None if either of the two cells is a wall)
+#   dead_squares is the set of cells from which a crate can never be pushed to any goal (even if there are no other crates)
 @dataclass(eq=False, frozen=True)
 class SokobanLayout:
-    __slots__ = ("width", "height", "walkable", "goals")
+    __slots__ = ("width", "height", "walkable", "goals", "neighbors", "push_targets", "dead_squares")
     width: int
     height: int
     walkable: FrozenSet[Point]
     goals: FrozenSet[Point]
+    neighbors: Dict[Point, Tuple[Optional[Point], ...]]
+    push_targets: Dict[Point, Tuple[Optional[Point], ...]]
+    dead_squares: FrozenSet[Point]
+
+    @staticmethod
+    def build(width: int, height: int, walkable: FrozenSet[Point], goals: FrozenSet[Point]) -> 'SokobanLayout':
+        neighbors, push_targets = {}, {}
+        for cell in walkable:
+            cell_neighbors, cell_push_targets = [], []
+            for direction in Direction:
+                position = cell + direction.to_vector()
+                crate_position = position + direction.to_vector()
+                cell_neighbors.append(position if position in walkable else None)
+                cell_push_targets.append(crate_position if position in walkable and crate_position in walkable else None)
+            neighbors[cell] = tuple(cell_neighbors)
+            push_targets[cell] = tuple(cell_push_targets)
+        # To find the dead squares, we start from the goals and pull the crate in every possible direction.
+        # Pulling a crate from a cell to its neighbor requires the player to step from the neighbor to the cell after it,
+        # so it is possible exactly when pushing from the cell in that direction is possible.
+        # Every cell that a crate cannot be pulled to is a dead square.
+        live = set(goals)
+        queue = deque(goals)
+        while queue:
+            cell = queue.popleft()
+            for direction in Direction:
+                if push_targets[cell][direction] is None: continue
+                position = neighbors[cell][direction]
+                if position not in live:
+                    live.add(position)
+                    queue.append(position)
+        return SokobanLayout(width, height, walkable, goals, neighbors, push_targets, frozenset(walkable - live))
+
+    def __reduce__(self):
+        return (SokobanLayout, (self.width, self.height, self.walkable, self.goals, self.neighbors, self.push_targets, self.dead_squares))
 
 # For the sokoban state, we use dataclass with frozen=True to automatically implement:
 #   the constructor, the == operator, the hash function and to make the class immutable
@@ -46,6 +86,9 @@ class SokobanState:
     player: Point
     crates: FrozenSet[Point]
 
+    def __reduce__(self):
+        return (SokobanState, (self.layout, self.player, self.crates))
+
     # This operator will convert the state to a string containing the grid representation of the level at the current state
     def __str__(self) -> str:
         def position_to_str(position):
@@ -68,11 +111,48 @@ AllSokobanActions = [
     Direction.LEFT
 ]
 
+# This is a tuple of all the directions in the order of the Direction enum (which is the order of the lookup tables)
+AllDirections = tuple(Direction)
+
+# Checks if the crate can never be moved again along both axes (horizontal and vertical).
+# A crate is blocked along an axis if there is a wall on either side, or if both sides are dead squares,
+# or if there is a frozen crate on either side (while checking neighbors, the crates in "visited" are treated as walls).
+def is_frozen(layout: SokobanLayout, crates: FrozenSet[Point], crate: Point, visited: Optional[Set[Point]] = None) -> bool:
+    visited = {crate} if visited is None else visited | {crate}
+    neighbors = layout.neighbors[crate]
+    for first, second in ((Direction.LEFT, Direction.RIGHT), (Direction.UP, Direction.DOWN)):
+        before, after = neighbors[first], neighbors[second]
+        blocked = before is None or after is None or before in visited or after in visited \
+            or (before in layout.dead_squares and after in layout.dead_squares) \
+            or (before in crates and is_frozen(layout, crates, before, visited)) \
+            or (after in crates and is_frozen(layout, crates, after, visited))
+        if not blocked:
+            return False
+    return True
+
+# Checks if pushing a crate to the given position caused a deadlock, by only examining the crate that just moved:
+# The crate is on a dead square, or it froze while not on a goal, or it froze on a goal and a neighboring crate
+# that is not on a goal froze with it
+def is_push_deadlock(layout: SokobanLayout, crates: FrozenSet[Point], crate: Point) -> bool:
+    if crate in layout.dead_squares:
+        return True
+    if not is_frozen(layout, crates, crate):
+        return False
+    if crate not in layout.goals:
+        return True
+    return any(
+        neighbor in crates and neighbor not in layout.goals and is_frozen(layout, crates, neighbor)
+        for neighbor in layout.neighbors[crate]
+    )
+
 # This is the implementation of the sokoban problem
 class SokobanProblem(Problem[SokobanState, Direction]):
     # The problem will contain the sokoban layout and the inital state
     layout: SokobanLayout
     initial_state: SokobanState
+    # If enabled, get_actions drops the pushes that lead to a deadlock (see "is_push_deadlock")
+    # It is disabled by default since it changes the number of expanded nodes
+    prune_deadlocks: bool = False
 
     def get_initial_state(self) -> SokobanState:
         return self.initial_state
@@ -84,28 +164,35 @@ class SokobanProblem(Problem[SokobanState, Direction]):
     @track_call_count
     def get_actions(self, state: SokobanState) -> Iterable[Direction]:
         actions = []
-        for direction in Direction:
-            position = state.player + direction.to_vector()
+        crates = state.crates
+        neighbors = self.layout.neighbors[state.player]
+        push_targets = self.layout.push_targets[state.player]
+        for direction in AllDirections:
+            position = neighbors[direction]
             # Disallow walking into walls
-            if position not in self.layout.walkable: continue
+            if position is None: continue
             # Check if walking into a crate
-            if position in state.crates:
+            if position in crates:
                 # make sure that the crate is not pushed into a wall or another crate
-                crate_position = position + direction.to_vector()
-                if crate_position not in self.layout.walkable or crate_position in state.crates:
+                crate_position = push_targets[direction]
+                if crate_position is None or crate_position in crates:
+                    continue
+                # If desired, make sure that the crate is not pushed into a deadlock
+                if self.prune_deadlocks and is_push_deadlock(
+                        self.layout, crates.symmetric_difference({position, crate_position}), crate_position):
                     continue
             actions.append(direction)
         return actions
 
     def get_successor(self, state: SokobanState, action: Direction) -> SokobanState:
-        player = state.player + action.to_vector()
+        player = self.layout.neighbors[state.player][action]
         crates = state.crates
-        if player not in self.layout.walkable:
+        if player is None:
             # If we try to walk into a wall, then this action is wrong
             raise Exception(f"Invalid action {action} in state:" + "\n" + str(state))
         if player in crates:
-            crate_position = player + action.to_vector()
-            if crate_position not in self.layout.walkable or crate_position in crates:
+            crate_position = self.layout.push_targets[state.player][action]
+            if crate_position is None or crate_position in crates:
                 # If we try to push a crate into a wall or another crate, then this action is wrong
                 raise Exception(f"Invalid action {action} in state:" + "\n" + str(state))
             # If we walk to a crate, we push it
@@ -140,7 +227,7 @@ class SokobanProblem(Problem[SokobanState, Direction]):
                         crates.add(Point(x, y))
                         goals.add(Point(x, y))
         problem = SokobanProblem()
-        problem.layout = SokobanLayout(width, height, frozenset(walkable), frozenset(goals))
+        problem.layout = SokobanLayout.build(width, height, frozenset(walkable), frozenset(goals))
         problem.initial_state = SokobanState(problem.layout, player, frozenset(crates))
         return problem
 
@@ -148,4 +235,159 @@ class SokobanProblem(Problem[SokobanState, Direction]):
     @staticmethod
     def from_file(path: str) -> 'SokobanProblem':
         with open(path, 'r') as f:
-            return SokobanProblem.from_text(f.read())
\ No newline at end of file
+            return SokobanProblem.from_text(f.read())
+
+
+# The packed layout is a compact version of the sokoban layout where every cell is an integer index into the grid
+# and a set of cells is an integer bitboard (bit 'i' is set if cell 'i' is in the set).
+# The grid is padded by a wall row above and below the level and a wall column to its right,
+# so the neighbors of every walkable cell are valid indices and moving off a row never wraps into a walkable cell.
+# The original layout is kept as "source" to convert packed states back to points.
+@dataclass(eq=False, frozen=True)
+class PackedSokobanLayout:
+    __slots__ = ("source", "stride", "walkable", "goals", "offsets")
+    source: SokobanLayout
+    stride: int
+    walkable: int
+    goals: int
+    offsets: Tuple[Tuple[Direction, int], ...] # The index offset of each direction (in the order of the Direction enum)
+
+    @staticmethod
+    def from_layout(layout: SokobanLayout) -> 'PackedSokobanLayout':
+        stride = layout.width + 1
+        offsets = tuple((direction, direction.to_vector().x + direction.to_vector().y * stride) for direction in Direction)
+        walkable = sum(1 << ((point.y + 1) * stride + point.x) for point in layout.walkable)
+        goals = sum(1 << ((point.y + 1) * stride + point.x) for point in layout.goals)
+        return PackedSokobanLayout(layout, stride, walkable, goals, offsets)
+
+    def __reduce__(self):
+        return (PackedSokobanLayout, (self.source, self.stride, self.walkable, self.goals, self.offsets))
+
+    # Converts a point to a cell index
+    def to_cell(self, point: Point) -> int:
+        return (point.y + 1) * self.stride + point.x
+
+    # Converts a cell index to a point
+    def to_point(self, cell: int) -> Point:
+        y, x = divmod(cell, self.stride)
+        return Point(x, y - 1)
+
+    # Converts a set of points to a bitboard
+    def pack_points(self, points: Iterable[Point]) -> int:
+        bitboard = 0
+        for point in points:
+            bitboard |= 1 << self.to_cell(point)
+        return bitboard
+
+    # Converts a bitboard to a set of points
+    def unpack_points(self, bitboard: int) -> FrozenSet[Point]:
+        points = []
+        while bitboard:
+            lowest = bitboard & -bitboard
+            points.append(self.to_point(lowest.bit_length() - 1))
+            bitboard ^= lowest
+        return frozenset(points)
+
+# The packed state stores the player as a cell index and the crates as a bitboard
+# Hashing and comparing it only touches two integers, which is much cheaper than hashing a frozenset of points
+@dataclass(frozen=True)
+class PackedSokobanState:
+    __slots__ = ("layout", "player", "crates")
+    layout: PackedSokobanLayout
+    player: int
+    crates: int
+
+    @staticmethod
+    def pack(layout: PackedSokobanLayout, state: SokobanState) -> 'PackedSokobanState':
+        return PackedSokobanState(layout, layout.to_cell(state.player), layout.pack_points(state.crates))
+
+    # Converts the packed state back to a sokoban state (with points)
+    def unpack(self) -> SokobanState:
+        return SokobanState(self.layout.source, self.layout.to_point(self.player), self.layout.unpack_points(self.crates))
+
+    def __reduce__(self):
+        return (PackedSokobanState, (self.layout, self.player, self.crates))
+
+    def __str__(self) -> str:
+        return str(self.unpack())
+
+# This is the implementation of the sokoban problem using the packed states
+# It has the same actions, costs and solutions as the sokoban problem,
+# but the move generation only uses shifts and masks on integers
+class PackedSokobanProblem(Problem[PackedSokobanState, Direction]):
+    # The problem will contain the packed layout, the inital state and the original sokoban problem
+    layout: PackedSokobanLayout
+    initial_state: PackedSokobanState
+    source: SokobanProblem
+
+    def get_initial_state(self) -> PackedSokobanState:
+        return self.initial_state
+
+    def is_goal(self, state: PackedSokobanState) -> bool:
+        return self.layout.goals == state.crates
+
+    # We use @track_call_count to track the number of times this function was called to count the number of explored nodes
+    @track_call_count
+    def get_actions(self, state: PackedSokobanState) -> Iterable[Direction]:
+        actions = []
+        player, crates = state.player, state.crates
+        walkable = self.layout.walkable
+        for direction, offset in self.layout.offsets:
+            position = player + offset
+            # Disallow walking into walls
+            if not (walkable >> position) & 1: continue
+            # Check if walking into a crate
+            if (crates >> position) & 1:
+                # make sure that the crate is not pushed into a wall or another crate
+                crate_position = position + offset
+                if not (walkable >> crate_position) & 1 or (crates >> crate_position) & 1:
+                    continue
+            actions.append(direction)
+        return actions
+
+    def get_successor(self, state: PackedSokobanState, action: Direction) -> PackedSokobanState:
+        offset = self.layout.offsets[action][1]
+        player = state.player + offset
+        crates = state.crates
+        walkable = self.layout.walkable
+        if not (walkable >> player) & 1:
+            # If we try to walk into a wall, then this action is wrong
+            raise Exception(f"Invalid action {action} in state:" + "\n" + str(state))
+        if (crates >> player) & 1:
+            crate_position = player + offset
+            if not (walkable >> crate_position) & 1 or (crates >> crate_position) & 1:
+                # If we try to push a crate into a wall or another crate, then this action is wrong
+                raise Exception(f"Invalid action {action} in state:" + "\n" + str(state))
+            # If we walk to a crate, we push it
+            crates ^= (1 << player) | (1 << crate_position)
+        return PackedSokobanState(state.layout, player, crates)
+
+    def get_cost(self, state: PackedSokobanState, action: Direction) -> float:
+        # All actions have the same cost
+        return 1
+
+    # Create a packed sokoban problem from a sokoban problem
+    @staticmethod
+    def from_problem(source: SokobanProblem) -> 'PackedSokobanProblem':
+        problem = PackedSokobanProblem()
+        problem.source = source
+        problem.layout = PackedSokobanLayout.from_layout(source.layout)
+        problem.initial_state = PackedSokobanState.pack(problem.layout, source.initial_state)
+        return problem
+
+    # Read a packed sokoban problem from text containing a grid of tiles
+    @staticmethod
+    def from_text(text: str) -> 'PackedSokobanProblem':
+        return PackedSokobanProblem.from_problem(SokobanProblem.from_text(text))
+
+    # Read a packed sokoban problem from file containing a grid of tiles
+    @staticmethod
+    def from_file(path: str) -> 'PackedSokobanProblem':
+        return PackedSokobanProblem.from_problem(SokobanProblem.from_file(path))
+
+# Heuristics are written for sokoban states (with points), so this function adapts a heuristic to the packed problem
+# by evaluating it on the original problem and the unpacked state
+def packed_heuristic(heuristic: HeuristicFunction) -> HeuristicFunction:
+    def packed(problem: PackedSokobanProblem, state: PackedSokobanState) -> float:
+        return heuristic(problem.source, state.unpack())
+    return packed
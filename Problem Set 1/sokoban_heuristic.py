@@ -1,7 +1,7 @@
-from collections import deque
-from typing import List
+from collections import OrderedDict, deque
+from typing import Dict, FrozenSet, List
 
-from sokoban import SokobanProblem, SokobanState, SokobanLayout
+from sokoban import SokobanProblem, SokobanState, SokobanLayout, is_frozen
 from mathutils import Direction, Point, manhattan_distance, euclidean_distance
 from helpers.utils import NotImplemented
 
@@ -38,23 +38,62 @@ def flod_fill(layout: SokobanLayout) -> List[List[int]]:
     return graph
 
 
+# Returns the crates that are connected to the given crate through adjacent crates (including the crate itself)
+# Whether a crate is frozen only depends on the crates connected to it (see "is_frozen")
+def connected_crates(layout: SokobanLayout, crates: FrozenSet[Point], crate: Point) -> List[Point]:
+    component, stack = {crate}, [crate]
+    while stack:
+        for neighbor in layout.neighbors[stack.pop()]:
+            if neighbor is not None and neighbor in crates and neighbor not in component:
+                component.add(neighbor)
+                stack.append(neighbor)
+    return list(component)
+
+
+# The maximum number of crate configurations whose deadlock results are cached (the least recently used ones are evicted)
+FROZEN_CACHE_SIZE = 2**16
+
+
+# This function checks if a crate is on a dead square (a square from which it can never reach a goal)
+# or if a crate that is not on a goal can never be moved again (freeze deadlock)
+# The dead squares are computed once per layout (they include all the corners that are not goals)
+# The results are cached per crate configuration. If the configuration came by a single push from a cached one
+# that has no such crate (the same test as in "assignment_cost"), only the pushed crate can be on a new dead square,
+# and a crate can only become frozen if it is connected to the pushed crate, so only these crates are checked
+# (otherwise, e.g. if the parent was evicted, all the crates are checked)
+def has_frozen_crate(problem: SokobanProblem, state: SokobanState) -> bool:
+    cache = problem.cache()
+    if 'frozen' not in cache:
+        cache['frozen'] = OrderedDict()
+    frozen, layout, crates = cache['frozen'], problem.layout, state.crates
+    result = frozen.get(crates)
+    if result is not None:
+        frozen.move_to_end(crates)
+    else:
+        player = state.player
+        candidates = crates
+        for crate in layout.neighbors[player]:
+            if crate is None or crate not in crates: continue
+            if frozen.get(crates.symmetric_difference({crate, player})) is False:
+                if crate in layout.dead_squares:
+                    candidates = (crate,)
+                else:
+                    candidates = connected_crates(layout, crates, crate)
+                break
+        result = any(
+            crate in layout.dead_squares or (crate not in layout.goals and is_frozen(layout, crates, crate))
+            for crate in candidates
+        )
+        frozen[crates] = result
+        if len(frozen) > FROZEN_CACHE_SIZE:
+            frozen.popitem(last=False)
+    return result
+
+
 def check_dead_lock(layout: SokobanLayout, state: SokobanState, problem: SokobanProblem) -> int:
-    # Check if crate is in corner and not on goal
-    for crate in state.crates:
-        wall_indices = []
-        for direction in Direction:
-            if crate in problem.layout.goals:
-                continue
-            wall = crate + direction.to_vector()
-            if wall not in layout.walkable:
-                wall_indices.append(direction.value)
-        wall_indices.sort()
-        # Check if crate is in corner (Two adjacent walls beside it)
-        for i in range(1, len(wall_indices)):
-            if wall_indices[i] - wall_indices[i - 1] == 1:
-                return 1
-        if len(wall_indices) >= 2 and wall_indices[-1] == 3 and wall_indices[0] == 0:
-            return 1
+    # Check if a crate is on a dead square or frozen while not on a goal
+    if has_frozen_crate(problem, state):
+        return 1
     # Check case if crate is between a wall and another crate
     for crate in state.crates:
         # Check if crate is beside maze outer walls and not on goal
@@ -139,3 +178,152 @@ def strong_heuristic(problem: SokobanProblem, state: SokobanState) -> float:
     # res += sum([min([manhattan_distance(crate, goal) for goal in problem.layout.goals]) for crate in state.crates])
     # res += sum([min([euclidean_distance(crate, goal) for goal in problem.layout.goals]) for crate in state.crates])
     return res
+
+
+# This function computes a separate distance table for every goal using BFS
+# where distances[goal][cell] is the walking distance between the goal and the cell (or area if it is unreachable)
+def goal_distances(layout: SokobanLayout) -> Dict[Point, Dict[Point, int]]:
+    area = 1000000000
+    distances = {}
+    for goal in layout.goals:
+        table = {cell: area for cell in layout.walkable}
+        table[goal] = 0
+        queue = deque([goal])
+        while queue:
+            cell = queue.popleft()
+            for neighbor in layout.neighbors[cell]:
+                if neighbor is not None and table[neighbor] == area:
+                    table[neighbor] = table[cell] + 1
+                    queue.append(neighbor)
+        distances[goal] = table
+    return distances
+
+
+# The crate assignment is a minimum cost perfect matching between the crates (rows) and the goals (columns)
+# where the cost of matching a crate to a goal is the distance between them.
+# It is solved using the Hungarian algorithm (with potentials) which adds the rows one by one,
+# so when a single crate moves, we only need to replace its row and add it again in O(n^2) instead of solving from scratch.
+# The arrays u, v (potentials), p (the row matched to each column) and way are 1-indexed as in the Hungarian algorithm.
+class CrateAssignment:
+    __slots__ = ("crates", "costs", "u", "v", "p")
+
+    def __init__(self, crates: List[Point], costs: List[List[int]], u: List[int], v: List[int], p: List[int]) -> None:
+        self.crates = crates
+        self.costs = costs
+        self.u = u
+        self.v = v
+        self.p = p
+
+    # Solves the assignment for the given crates from scratch
+    @staticmethod
+    def solve(crates: List[Point], goals: List[Point], distances: Dict[Point, Dict[Point, int]]) -> 'CrateAssignment':
+        size = len(crates)
+        costs = [[distances[goal][crate] for goal in goals] for crate in crates]
+        assignment = CrateAssignment(list(crates), costs, [0] * (size + 1), [0] * (size + 1), [0] * (size + 1))
+        for row in range(1, size + 1):
+            assignment._add_row(row)
+        return assignment
+
+    # Returns a new assignment where the crate at "before" moved to "after"
+    # The other rows keep their matches and potentials, so only the moved row is added again
+    def move(self, before: Point, after: Point, goals: List[Point], distances: Dict[Point, Dict[Point, int]]) -> 'CrateAssignment':
+        row = self.crates.index(before) + 1
+        crates, costs, p = self.crates.copy(), self.costs.copy(), self.p.copy()
+        crates[row - 1] = after
+        costs[row - 1] = [distances[goal][after] for goal in goals]
+        p[p.index(row, 1)] = 0
+        u = self.u.copy()
+        # Since every cost is non-negative and v is never positive, a zero potential keeps the new row feasible
+        u[row] = 0
+        assignment = CrateAssignment(crates, costs, u, self.v.copy(), p)
+        assignment._add_row(row)
+        return assignment
+
+    # Finds the shortest augmenting path from the given row (which is not matched yet) and applies it
+    def _add_row(self, row: int) -> None:
+        costs, u, v, p = self.costs, self.u, self.v, self.p
+        size = len(costs)
+        infinity = float('inf')
+        minv = [infinity] * (size + 1)
+        used = [False] * (size + 1)
+        way = [0] * (size + 1)
+        p[0] = row
+        column = 0
+        while True:
+            used[column] = True
+            current_row = p[column]
+            row_costs, row_potential = costs[current_row - 1], u[current_row]
+            delta, next_column = infinity, 0
+            for j in range(1, size + 1):
+                if not used[j]:
+                    reduced = row_costs[j - 1] - row_potential - v[j]
+                    if reduced < minv[j]:
+                        minv[j] = reduced
+                        way[j] = column
+                    if minv[j] < delta:
+                        delta, next_column = minv[j], j
+            for j in range(size + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            column = next_column
+            if p[column] == 0:
+                break
+        while column:
+            previous = way[column]
+            p[column] = p[previous]
+            column = previous
+
+    # The total cost of the matching
+    def cost(self) -> int:
+        costs, p = self.costs, self.p
+        return sum(costs[p[j] - 1][j - 1] for j in range(1, len(costs) + 1))
+
+
+# The maximum number of crate configurations whose assignments are cached (the least recently used ones are evicted)
+ASSIGNMENT_CACHE_SIZE = 2**16
+
+
+# This function returns the minimum total distance needed to push every crate to a different goal
+# The assignments are cached per crate configuration. If the configuration is new, we check if it came from a cached one
+# by a single push (the pushed crate is next to the player and its previous position is the player's position),
+# in which case the assignment is updated incrementally (otherwise, e.g. if the parent was evicted, it is solved from scratch)
+def assignment_cost(problem: SokobanProblem, state: SokobanState) -> int:
+    cache = problem.cache()
+    if 'goal_distances' not in cache:
+        cache['goal_distances'] = goal_distances(problem.layout)
+        cache['goal_list'] = list(problem.layout.goals)
+        cache['assignments'] = OrderedDict()
+    distances, goals, assignments = cache['goal_distances'], cache['goal_list'], cache['assignments']
+    crates = state.crates
+    assignment = assignments.get(crates)
+    if assignment is not None:
+        assignments.move_to_end(crates)
+    else:
+        player = state.player
+        for crate in problem.layout.neighbors[player]:
+            if crate is None or crate not in crates: continue
+            parent = assignments.get(crates.symmetric_difference({crate, player}))
+            if parent is not None:
+                assignment = parent.move(player, crate, goals, distances)
+                break
+        else:
+            assignment = CrateAssignment.solve(list(crates), goals, distances)
+        assignments[crates] = assignment
+        if len(assignments) > ASSIGNMENT_CACHE_SIZE:
+            assignments.popitem(last=False)
+    return assignment.cost()
+
+
+# This heuristic is the same as the strong heuristic, but instead of the sum of the distances between each crate and its nearest goal,
+# it uses the cost of the best assignment of crates to goals (where no two crates can be matched to the same goal)
+# It is also consistent since a single step moves at most one crate by one cell which changes the assignment cost by at most one
+def assignment_heuristic(problem: SokobanProblem, state: SokobanState) -> float:
+    # IMPORTANT: DO NOT USE "problem.get_actions" HERE.
+    is_dead_lock = check_dead_lock(problem.layout, state, problem)
+    res = 1000000000 * is_dead_lock
+    res += assignment_cost(problem, state)
+    res += (min(manhattan_distance(state.player, crate) for crate in state.crates) - 1)
+    return res
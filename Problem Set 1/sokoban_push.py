@@ -0,0 +1,192 @@
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, Iterable, List, Tuple
+
+from mathutils import Direction, Point
+from problem import Problem, S, Solution
+from sokoban import SokobanLayout, SokobanProblem, SokobanState
+from sokoban_symmetry import Symmetry, canonical_key, layout_symmetries
+from helpers.utils import track_call_count
+
+# This file contains a push level formulation of the Sokoban problem
+# Instead of moving the player one step at a time, every action pushes a crate
+# after walking (via the shortest path) to the cell behind it.
+# Since the player can walk anywhere inside its reachable region without changing the crates,
+# all the states where the player is inside the same region are considered equal,
+# which reduces the state space by orders of magnitude.
+# Optionally, the states that are images of each other under a symmetry of the layout are merged too (see sokoban_symmetry.py).
+
+# An action is a crate position and the direction in which it is pushed
+PushAction = Tuple[Point, Direction]
+
+# The push state is identified by its key which contains the crates and the player's reachable region,
+# where the region is normalized to its minimum cell (in row major order).
+# If symmetries are given, the key is the least key among the images of the state under the symmetries.
+# It still stores the actual player position (which is not compared or hashed) to compute the walking costs
+# and to expand the solution back to steps. Note that, since the states that only differ by the player position are merged,
+# the total number of steps of the solution is not guaranteed to be optimal (but the search is much faster).
+@dataclass(eq=False, frozen=True)
+class SokobanPushState:
+    __slots__ = ("layout", "player", "crates", "key")
+    layout: SokobanLayout
+    player: Point
+    crates: FrozenSet[Point]
+    key: Tuple
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, SokobanPushState) and self.key == other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __reduce__(self):
+        return (SokobanPushState, (self.layout, self.player, self.crates, self.key))
+
+    # Create a push state of the problem where the player is at the given position
+    # (the key is computed using the problem's symmetries, if any)
+    @staticmethod
+    def create(problem: 'SokobanPushProblem', player: Point, crates: FrozenSet[Point]) -> 'SokobanPushState':
+        distances, _ = reachability(problem, player, crates)
+        if problem.symmetries is None:
+            key = (min(distances, key=lambda cell: (cell.y, cell.x)), crates)
+        else:
+            key = canonical_key(problem.symmetries, distances.keys(), crates)
+        return SokobanPushState(problem.layout, player, crates, key)
+
+    def __str__(self) -> str:
+        return str(SokobanState(self.layout, self.player, self.crates))
+
+# This function runs a BFS from the player position (where crates are obstacles) and returns:
+#   distances[cell] which is the walking distance from the player to each reachable cell
+#   directions[cell] which is the direction of the last step on the shortest path from the player to each reachable cell
+# It is cached since the same state is usually passed to get_actions, get_cost and get_successor consecutively.
+# The cache is stored in the problem's cache (so it is released with the problem) and it keeps the results
+# of the last REACHABILITY_CACHE_SIZE calls (the least recently used ones are evicted).
+REACHABILITY_CACHE_SIZE = 2**12
+
+def reachability(problem: 'SokobanPushProblem', player: Point, crates: FrozenSet[Point]) -> Tuple[Dict[Point, int], Dict[Point, Direction]]:
+    cache = problem.cache()
+    if 'reachability' not in cache:
+        cache['reachability'] = OrderedDict()
+    results = cache['reachability']
+    result = results.get((player, crates))
+    if result is not None:
+        results.move_to_end((player, crates))
+        return result
+    layout = problem.layout
+    distances = {player: 0}
+    directions = {}
+    queue = deque([player])
+    while queue:
+        cell = queue.popleft()
+        for direction, neighbor in zip(Direction, layout.neighbors[cell]):
+            if neighbor is None or neighbor in crates or neighbor in distances: continue
+            distances[neighbor] = distances[cell] + 1
+            directions[neighbor] = direction
+            queue.append(neighbor)
+    result = results[(player, crates)] = (distances, directions)
+    if len(results) > REACHABILITY_CACHE_SIZE:
+        results.popitem(last=False)
+    return result
+
+# This function returns the list of steps that the player takes on the shortest path to the target
+def walking_path(problem: 'SokobanPushProblem', player: Point, crates: FrozenSet[Point], target: Point) -> List[Direction]:
+    _, directions = reachability(problem, player, crates)
+    path = []
+    while target != player:
+        direction = directions[target]
+        path.append(direction)
+        target = target - direction.to_vector()
+    path.reverse()
+    return path
+
+# This is the implementation of the push level sokoban problem
+class SokobanPushProblem(Problem[SokobanPushState, PushAction]):
+    # The problem will contain the sokoban layout and the inital state
+    layout: SokobanLayout
+    initial_state: SokobanPushState
+    # The symmetries of the layout used to merge the symmetric states (or None to only merge the states of the same region)
+    symmetries: Tuple[Symmetry, ...] = None
+
+    def get_initial_state(self) -> SokobanPushState:
+        return self.initial_state
+
+    def is_goal(self, state: SokobanPushState) -> bool:
+        return self.layout.goals == state.crates
+
+    # We use @track_call_count to track the number of times this function was called to count the number of explored nodes
+    # The crates are sorted to make the order of the actions deterministic
+    # Pushes into dead squares are never considered since the crate can not reach a goal from there
+    @track_call_count
+    def get_actions(self, state: SokobanPushState) -> Iterable[PushAction]:
+        actions = []
+        distances, _ = reachability(self, state.player, state.crates)
+        for crate in sorted(state.crates, key=lambda cell: (cell.y, cell.x)):
+            for direction in Direction:
+                # The player has to stand behind the crate
+                stand = self.layout.neighbors[crate][direction.rotate(2)]
+                if stand not in distances: continue
+                # The crate must be pushed into an empty walkable cell
+                target = self.layout.push_targets[stand][direction]
+                if target is None or target in state.crates or target in self.layout.dead_squares: continue
+                actions.append((crate, direction))
+        return actions
+
+    def get_successor(self, state: SokobanPushState, action: PushAction) -> SokobanPushState:
+        crate, direction = action
+        target = self.layout.neighbors[crate][direction]
+        crates = state.crates.symmetric_difference({crate, target})
+        return SokobanPushState.create(self, crate, crates)
+
+    # The cost is the number of steps needed to walk behind the crate plus one step to push it
+    def get_cost(self, state: SokobanPushState, action: PushAction) -> float:
+        crate, direction = action
+        distances, _ = reachability(self, state.player, state.crates)
+        return distances[self.layout.neighbors[crate][direction.rotate(2)]] + 1
+
+    # Create a push level problem from a sokoban problem (starting from the given state or the problem's initial state)
+    # If symmetry is True, the states that are symmetric under the symmetries of the layout are merged
+    @staticmethod
+    def from_problem(source: SokobanProblem, state: SokobanState = None, symmetry: bool = False) -> 'SokobanPushProblem':
+        state = state or source.get_initial_state()
+        problem = SokobanPushProblem()
+        problem.layout = source.layout
+        if symmetry:
+            problem.symmetries = layout_symmetries(source.layout)
+        problem.initial_state = SokobanPushState.create(problem, state.player, state.crates)
+        return problem
+
+    # Read a push level sokoban problem from text containing a grid of tiles
+    @staticmethod
+    def from_text(text: str) -> 'SokobanPushProblem':
+        return SokobanPushProblem.from_problem(SokobanProblem.from_text(text))
+
+    # Read a push level sokoban problem from file containing a grid of tiles
+    @staticmethod
+    def from_file(path: str) -> 'SokobanPushProblem':
+        return SokobanPushProblem.from_problem(SokobanProblem.from_file(path))
+
+# This function expands a push level solution into the list of steps (directions) taken by the player
+def to_step_actions(problem: SokobanPushProblem, state: SokobanPushState, solution: List[PushAction]) -> List[Direction]:
+    steps = []
+    player, crates = state.player, state.crates
+    for crate, direction in solution:
+        stand = problem.layout.neighbors[crate][direction.rotate(2)]
+        steps.extend(walking_path(problem, player, crates, stand))
+        steps.append(direction)
+        crates = crates.symmetric_difference({crate, problem.layout.neighbors[crate][direction]})
+        player = crate
+    return steps
+
+# This function wraps a search function so that it solves the sokoban problem at the push level
+# and returns the solution as steps. The wrapped function can be used by any search agent
+# (the extra arguments such as the heuristic are passed to the search function as is).
+def push_level_search(search_fn: Callable[..., Solution], symmetry: bool = False) -> Callable[..., Solution]:
+    def search(problem: SokobanProblem, state: SokobanState, *args) -> Solution:
+        push_problem = SokobanPushProblem.from_problem(problem, state, symmetry)
+        initial_state = push_problem.get_initial_state()
+        solution = search_fn(push_problem, initial_state, *args)
+        if solution is None:
+            return None
+        return to_step_actions(push_problem, initial_state, solution)
+    return search
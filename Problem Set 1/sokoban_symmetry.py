@@ -0,0 +1,121 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, FrozenSet, Iterable, Tuple
+
+from mathutils import Point
+from problem import Solution
+from sokoban import SokobanLayout, SokobanProblem, SokobanState
+
+# This file contains a canonicalization layer for the Sokoban states.
+# Many levels are symmetric: mirroring or rotating the board maps the walkable cells to walkable cells
+# and the goals to goals. Two states which are images of each other under such a symmetry have the same
+# optimal cost to the goal, so the search only needs to explore one of them.
+# Every state is given a canonical key which is the least image of the state under all the symmetries of its layout,
+# and the canonical states compare and hash by that key. Since the search functions store the states in their
+# explored sets and their best path cost tables, these tables act as a transposition table which merges the symmetric
+# states without any change to the search functions.
+# Note that the player is keyed by its exact cell here. Keying it by its reachable region (the minimum reachable cell)
+# is only valid for the push level problem (see sokoban_push.py) where walking is part of the push actions.
+# At the step level, it would merge the state before a step with the state after it, so the search could never walk.
+
+# A symmetry maps every walkable cell to the index of its image (in row major order inside the bounding box of the walkable cells)
+Symmetry = Dict[Point, int]
+
+# Returns the symmetries of the layout (the identity is always the first one)
+# The candidates are the mirrors and the rotation by 180 degrees (and for square boxes, the transposes and the other rotations).
+# A candidate is a symmetry of the layout only if it maps the walkable cells to themselves and the goals to themselves.
+@lru_cache(2**6)
+def layout_symmetries(layout: SokobanLayout) -> Tuple[Symmetry, ...]:
+    left, top = min(cell.x for cell in layout.walkable), min(cell.y for cell in layout.walkable)
+    width = max(cell.x for cell in layout.walkable) - left + 1
+    height = max(cell.y for cell in layout.walkable) - top + 1
+    transforms = [
+        lambda x, y: (x, y),
+        lambda x, y: (width - 1 - x, y),
+        lambda x, y: (x, height - 1 - y),
+        lambda x, y: (width - 1 - x, height - 1 - y),
+    ]
+    if width == height:
+        transforms += [
+            lambda x, y: (y, x),
+            lambda x, y: (height - 1 - y, width - 1 - x),
+            lambda x, y: (height - 1 - y, x),
+            lambda x, y: (y, width - 1 - x),
+        ]
+    symmetries = []
+    for transform in transforms:
+        images = {cell: Point(*transform(cell.x - left, cell.y - top)) + Point(left, top) for cell in layout.walkable}
+        if set(images.values()) != layout.walkable: continue
+        if {images[goal] for goal in layout.goals} != layout.goals: continue
+        symmetries.append({cell: (image.y - top) * width + (image.x - left) for cell, image in images.items()})
+    return tuple(symmetries)
+
+# Returns the canonical key of the state given the cells that identify the player and the crate cells.
+# For a step level state, the player cells are only the player position
+# while for a push level state, they are the player's reachable region.
+# If the layout has no symmetries other than the identity, the key is simply the minimum player cell and the crates.
+def canonical_key(symmetries: Tuple[Symmetry, ...], players: Iterable[Point], crates: FrozenSet[Point]) -> Tuple:
+    if len(symmetries) == 1:
+        return (min(players, key=lambda cell: (cell.y, cell.x)), crates)
+    players = tuple(players)
+    return min(
+        (min(symmetry[cell] for cell in players), tuple(sorted(symmetry[crate] for crate in crates)))
+        for symmetry in symmetries
+    )
+
+# The canonical state is a sokoban state which compares and hashes by its canonical key
+# Since it is still a sokoban state, the heuristics and the other sokoban functions can be applied to it as is
+@dataclass(eq=False, frozen=True)
+class CanonicalSokobanState(SokobanState):
+    __slots__ = ("key",)
+    key: Tuple
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, CanonicalSokobanState) and self.key == other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __reduce__(self):
+        return (CanonicalSokobanState, (self.layout, self.player, self.crates, self.key))
+
+# This is the sokoban problem over the canonical states
+# The actions, the costs and the goal test are the same as the sokoban problem,
+# so the solutions found for it can be applied to the original problem directly
+class CanonicalSokobanProblem(SokobanProblem):
+    symmetries: Tuple[Symmetry, ...]
+
+    def canonical(self, state: SokobanState) -> CanonicalSokobanState:
+        return CanonicalSokobanState(self.layout, state.player, state.crates, canonical_key(self.symmetries, (state.player,), state.crates))
+
+    def get_successor(self, state: CanonicalSokobanState, action) -> CanonicalSokobanState:
+        return self.canonical(super().get_successor(state, action))
+
+    # Create a canonical problem from a sokoban problem (starting from the given state or the problem's initial state)
+    @staticmethod
+    def from_problem(source: SokobanProblem, state: SokobanState = None) -> 'CanonicalSokobanProblem':
+        state = state or source.get_initial_state()
+        problem = CanonicalSokobanProblem()
+        problem.layout = source.layout
+        problem.prune_deadlocks = source.prune_deadlocks
+        problem.symmetries = layout_symmetries(source.layout)
+        problem.initial_state = problem.canonical(state)
+        return problem
+
+    # Read a canonical sokoban problem from text containing a grid of tiles
+    @staticmethod
+    def from_text(text: str) -> 'CanonicalSokobanProblem':
+        return CanonicalSokobanProblem.from_problem(SokobanProblem.from_text(text))
+
+    # Read a canonical sokoban problem from file containing a grid of tiles
+    @staticmethod
+    def from_file(path: str) -> 'CanonicalSokobanProblem':
+        return CanonicalSokobanProblem.from_problem(SokobanProblem.from_file(path))
+
+# This function wraps a search function so that it searches over the canonical states (merging the symmetric states)
+# The wrapped function can be used by any search agent (the extra arguments such as the heuristic are passed as is).
+def symmetric_search(search_fn: Callable[..., Solution]) -> Callable[..., Solution]:
+    def search(problem: SokobanProblem, state: SokobanState, *args) -> Solution:
+        canonical_problem = CanonicalSokobanProblem.from_problem(problem, state)
+        return search_fn(canonical_problem, canonical_problem.get_initial_state(), *args)
+    return search
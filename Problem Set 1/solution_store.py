@@ -0,0 +1,130 @@
+from functools import partial
+from types import CodeType
+from typing import Any, Callable
+import hashlib, json, os, pickle
+
+from problem import Problem, S, A, Solution
+
+# This file contains an on-disk store for the solutions found by the search agents, so that repeated runs
+# on the same problem with the same search configuration do not search again.
+# Every solution is stored in its own file whose name is a hash of:
+# 1. The fingerprint of the problem and the state from which the search started (see "fingerprint").
+# 2. The search configuration (a description of the search function, the heuristic and their parameters).
+# The unsolvable problems are stored too (as None). The store keeps at most "max_entries" solutions
+# and evicts the least recently used ones (the modification time of a file is updated whenever it is read).
+
+# Returns a text which identifies the problem and the state
+# The sokoban and the parking problems are identified by their grids (which contain the layout and the state),
+# the graph routing problem by its nodes, edges and goal and the other problems by their pickled bytes.
+def fingerprint(problem: Problem[S, A], state: S) -> str:
+    from sokoban import SokobanProblem, PackedSokobanProblem
+    from parking import ParkingProblem, PackedParkingProblem
+    from graph import GraphRoutingProblem
+    if isinstance(problem, (SokobanProblem, PackedSokobanProblem)):
+        return f"{type(problem).__name__}\n{state}"
+    if isinstance(problem, (ParkingProblem, PackedParkingProblem)):
+        grid = problem.convert_state_to_grid(state)
+        source = problem if isinstance(problem, ParkingProblem) else problem.source
+        slots = sorted((position.y, position.x, index) for position, index in source.slots.items())
+        return f"{type(problem).__name__}\n" + '\n'.join(''.join(row) for row in grid) + f"\n{slots}"
+    if isinstance(problem, GraphRoutingProblem):
+        graph = sorted((node.name, tuple(node.position), sorted(adjacent.name for adjacent in adjacency))
+                       for node, adjacency in problem.adjacency.items())
+        return json.dumps({"graph": graph, "state": state.name, "goal": problem.goal.name})
+    return pickle.dumps((problem, state)).hex()
+
+# Returns a text that describes a search function or a heuristic (including the arguments of partial functions)
+# The qualified name of a lambda or a nested function (e.g. the search returned by "symmetric_search") is shared by all
+# the functions created by the same code, so their description also contains a digest of their code
+# and the values they captured (the captured functions are described recursively).
+def describe(fn: Any) -> str:
+    if fn is None:
+        return "None"
+    if isinstance(fn, partial):
+        arguments = [describe_value(arg) for arg in fn.args] + [f"{key}={describe_value(value)}" for key, value in sorted(fn.keywords.items())]
+        return f"{describe(fn.func)}({', '.join(arguments)})"
+    name = f"{getattr(fn, '__module__', '')}.{getattr(fn, '__qualname__', repr(fn))}"
+    code = getattr(fn, '__code__', None)
+    if code is None or ('<locals>' not in name and '<lambda>' not in name):
+        return name
+    digest = code_digest(code)[:12]
+    cells = fn.__closure__ or ()
+    captured = [f"{variable}={describe_value(cell.cell_contents)}" for variable, cell in zip(code.co_freevars, cells)]
+    return f"{name}#{digest}[{', '.join(captured)}]"
+
+# Returns a digest of the code object (its bytecode, names and constants, including the nested code objects)
+def code_digest(code: CodeType) -> str:
+    constants = [code_digest(constant) if isinstance(constant, CodeType) else repr(constant) for constant in code.co_consts]
+    return hashlib.sha256(code.co_code + repr((code.co_names, constants)).encode()).hexdigest()
+
+# Returns a text that describes a value captured by (or passed to) a search function or a heuristic
+def describe_value(value: Any) -> str:
+    return describe(value) if callable(value) and not isinstance(value, type) else repr(value)
+
+class SolutionStore:
+    # The value returned by "load" when the solution is not in the store (since None means that there is no solution)
+    MISSING = object()
+
+    def __init__(self, directory: str, max_entries: int = 1024) -> None:
+        self.directory = directory
+        self.max_entries = max_entries
+        self.hits = self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, problem: Problem[S, A], state: S, config: str) -> str:
+        key = hashlib.sha256(f"{config}\n{fingerprint(problem, state)}".encode()).hexdigest()
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    # Returns the stored solution (or SolutionStore.MISSING if there is none)
+    def load(self, problem: Problem[S, A], state: S, config: str) -> Any:
+        path = self.path(problem, state, config)
+        try:
+            with open(path, 'rb') as f:
+                solution = pickle.load(f)
+        except (OSError, pickle.PickleError, EOFError):
+            self.misses += 1
+            return SolutionStore.MISSING
+        os.utime(path) # Mark the entry as recently used
+        self.hits += 1
+        return solution
+
+    def save(self, problem: Problem[S, A], state: S, config: str, solution: Solution) -> None:
+        path = self.path(problem, state, config)
+        # Write to a temporary file first so that a concurrent reader never sees a partial file
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as f:
+            pickle.dump(solution, f)
+        os.replace(temporary, path)
+        self.evict()
+
+    # Removes the least recently used entries until there are at most "max_entries" entries
+    def evict(self) -> None:
+        entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".pkl")]
+        if len(entries) <= self.max_entries: return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    # Returns the stored solution if it exists and can be applied to the problem,
+    # otherwise, it calls "search" and stores its solution
+    def solve(self, problem: Problem[S, A], state: S, config: str, search: Callable[[], Solution]) -> Solution:
+        solution = self.load(problem, state, config)
+        if solution is not SolutionStore.MISSING and is_applicable(problem, state, solution):
+            return solution
+        solution = search()
+        self.save(problem, state, config, solution)
+        return solution
+
+# Checks that the solution leads to a goal (the stored solutions are checked in case the problem definition changed)
+# It does not call "get_actions" since its calls are used to count the explored nodes
+def is_applicable(problem: Problem[S, A], state: S, solution: Solution) -> bool:
+    if solution is None: return True
+    try:
+        for action in solution:
+            state = problem.get_successor(state, action)
+    except Exception:
+        return False
+    return problem.is_goal(state)
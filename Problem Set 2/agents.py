@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Callable, Generic
+from typing import Callable, Generic, Optional
 from game import HeuristicFunction, Game, S, A
 from helpers.mt19937 import RandomGenerator
 
@@ -23,18 +23,25 @@ class HumanAgent(Agent[S, A]):
         return self.user_input_fn(game, state)
 
 # The search agent requests the action from a search algorithm
+# If a time budget (in seconds) is given, it is passed to the search function which must be an anytime search
+# (such as "iterative_deepening_alphabeta") that returns its best result once the budget runs out
 class SearchAgent(Agent[S, A]):
     def __init__(self,
         search_fn: Callable[[Game[S, A], S, HeuristicFunction, int], A],
         heuristic: HeuristicFunction = (lambda *_: 0), 
-        search_depth: int = -1) -> None:
+        search_depth: int = -1,
+        time_budget: Optional[float] = None) -> None:
         super().__init__()
         self.search_fn = search_fn
         self.heuristic = heuristic
         self.search_depth = search_depth
+        self.time_budget = time_budget
     
     def act(self, game: Game[S, A], state: S) -> A:
-        _, action = self.search_fn(game, state, self.heuristic, self.search_depth)
+        if self.time_budget is None:
+            _, action = self.search_fn(game, state, self.heuristic, self.search_depth)
+        else:
+            _, action = self.search_fn(game, state, self.heuristic, self.search_depth, time_budget=self.time_budget)
         return action
 
 # The random agent selects actions randomly
@@ -1,7 +1,9 @@
+from array import array
+from collections import deque
 from dataclasses import dataclass
-from copy import deepcopy
-from typing import Iterable, List, Optional, Set, Tuple
+from typing import FrozenSet, Iterable, List, Optional, Set, Tuple
 from enum import Enum
+import random
 
 from mathutils import Direction, Point
 from game import Game
@@ -24,57 +26,177 @@ class DungeonTile(str, Enum):
     DAGGER = "~"
     KEY = "K"
 
+# A Zobrist table assigns a random 64-bit key to every part of the dungeon state:
+#   the player position and death, the position and death of each monster (the monsters are identified by their turns),
+#   each remaining coin, dagger and key, the current turn, the time and the count of each item in the inventory.
+# The hash of a state is the XOR of the keys of its parts, so when an action changes a few parts of the state,
+# the hash of the successor is computed by XORing the keys of the changed parts (before and after) with the hash of the state.
+# The cell keys are stored in flat lists indexed by "y * width + x" since hashing a point is much slower than this arithmetic.
+# The time and the inventory counts are unbounded, so their keys are generated when they are first needed.
+# Each of them has its own random generator, so the keys are the same regardless of the order in which they are needed.
+class DungeonZobrist:
+    __slots__ = ("width", "player", "player_dead", "monsters", "monster_dead", "coins", "daggers", "keys", "turns", "counters")
+
+    def __init__(self, width: int, height: int, walkable: Set[Point], monster_count: int, seed: int = 0) -> None:
+        rng = random.Random(seed)
+        def cell_keys() -> List[int]:
+            return [rng.getrandbits(64) if Point(x, y) in walkable else 0 for y in range(height) for x in range(width)]
+        self.width = width
+        self.player = cell_keys()
+        self.player_dead = rng.getrandbits(64)
+        self.monsters = [cell_keys() for _ in range(monster_count)]
+        self.monster_dead = [rng.getrandbits(64) for _ in range(monster_count)]
+        self.coins = cell_keys()
+        self.daggers = cell_keys()
+        self.keys = cell_keys()
+        self.turns = [rng.getrandbits(64) for _ in range(monster_count + 1)]
+        self.counters = {name: (random.Random(f"{seed}:{name}"), []) for name in ("time", "daggers", "coins", "keys")}
+
+    # Returns the key of the given value of a counter ("time", "daggers", "coins" or "keys")
+    def counter(self, name: str, value: int) -> int:
+        rng, keys = self.counters[name]
+        while len(keys) <= value:
+            keys.append(rng.getrandbits(64))
+        return keys[value]
+
+    # Computes the hash of a state from scratch (the successors update the hash of their parent instead)
+    def __call__(self, state: 'DungeonState') -> int:
+        width = self.width
+        player, inventory = state.player, state.player.inventory
+        key = self.player[player.position.y * width + player.position.x] ^ self.turns[state.turn] ^ self.counter("time", state.time) \
+            ^ self.counter("daggers", inventory.daggers) ^ self.counter("coins", inventory.coins) ^ self.counter("keys", inventory.keys)
+        if not player.alive:
+            key ^= self.player_dead
+        for index, monster in enumerate(state.monsters):
+            key ^= self.monsters[index][monster.position.y * width + monster.position.x]
+            if not monster.alive:
+                key ^= self.monster_dead[index]
+        for coin in state.coins:
+            key ^= self.coins[coin.y * width + coin.x]
+        for dagger in state.daggers:
+            key ^= self.daggers[dagger.y * width + dagger.x]
+        for item in state.keys:
+            key ^= self.keys[item.y * width + item.x]
+        return key
+
+# The distance fields contain the shortest path distances between the walkable cells of a dungeon layout (used by the heuristic).
+# The cells are identified by their flat indices ("y * width + x"), and for every source cell, there are two flat arrays:
+#   distances[source][cell] which is the BFS distance from the source to the cell (or UNREACHABLE)
+#   predecessors[source][cell] which is the cell before the given cell on the shortest path from the source (or -1)
+# The arrays of a source are built by a BFS the first time the source is needed, then they are reused for all the states.
+# The paths are never stored, instead they are traversed (when needed) by following the predecessors from the target.
+class DistanceFields:
+    UNREACHABLE = 0xffffffff
+
+    __slots__ = ("width", "neighbors", "distances", "predecessors")
+
+    def __init__(self, width: int, height: int, walkable: Set[Point]) -> None:
+        self.width = width
+        # neighbors[cell] contains the walkable cells next to the cell (in the order of the directions)
+        self.neighbors: List[Tuple[int, ...]] = [()] * (width * height)
+        for cell in walkable:
+            positions = (cell + direction.to_vector() for direction in Direction if direction != Direction.NONE)
+            self.neighbors[cell.y * width + cell.x] = tuple(position.y * width + position.x for position in positions if position in walkable)
+        self.distances: List[Optional[array]] = [None] * (width * height)
+        self.predecessors: List[Optional[array]] = [None] * (width * height)
+
+    def index(self, point: Point) -> int:
+        return point.y * self.width + point.x
+
+    # Returns the distance array of the source (the cell index) and builds it if it does not exist
+    def field(self, source: int) -> array:
+        distances = self.distances[source]
+        if distances is None:
+            size = len(self.neighbors)
+            distances = array('q', [DistanceFields.UNREACHABLE]) * size
+            predecessors = array('q', [-1]) * size
+            distances[source] = 0
+            neighbors = self.neighbors
+            queue = deque([source])
+            while queue:
+                parent = queue.popleft()
+                distance = distances[parent] + 1
+                for child in neighbors[parent]:
+                    if distances[child] != DistanceFields.UNREACHABLE: continue
+                    distances[child] = distance
+                    predecessors[child] = parent
+                    queue.append(child)
+            self.distances[source] = distances
+            self.predecessors[source] = predecessors
+        return distances
+
+    # Returns the shortest path distance between two points (or UNREACHABLE if there is no path)
+    def distance(self, p1: Point, p2: Point) -> int:
+        return self.field(self.index(p1))[self.index(p2)]
+
 # Dungeon layout specifies the walkable locations and the exit location
-@dataclass
+# It also contains the Zobrist table used to hash the states of the dungeon
+# and the distance fields used by the heuristic
+# We disable the automatic equality implementation so that the layout is compared and hashed by its identity
+# (it is shared by all the states of the game)
+@dataclass(eq=False)
 class DungeonLayout:
     width: int
     height: int
     walkable: Set[Point]
     exit: Point
+    zobrist: DungeonZobrist
+    distances: DistanceFields
 
     def __deepcopy__(self, memo):
         return self
 
+# All the parts of the dungeon state are immutable, so the successor of a state shares all the parts
+# that the action did not change with the state (instead of copying the whole state).
+# We use dataclass with frozen=True to automatically implement:
+#   the constructor, the == operator, the hash function and to make the class immutable
+
 # The state of a player contains its position, whether it is alive or not and its inventory
-@dataclass
+@dataclass(frozen=True)
 class Player:
-    @dataclass
+    @dataclass(frozen=True)
     class Inventory:
+        __slots__ = ("daggers", "coins", "keys")
         daggers: int
         coins: int
         keys: int
 
+    __slots__ = ("position", "alive", "inventory")
     position: Point
     alive: bool
     inventory: Inventory
 
 # The state of a monster contains its position and whether it is alive or not
-@dataclass
+@dataclass(frozen=True)
 class Monster:
+    __slots__ = ("position", "alive")
     position: Point
     alive: bool
 
 # This will contain a reference to the dungeon layout and it will contain environment details that change across states such as:
 #   The player location and the locations of the monsters, remaining coins, daggers, key, etc. 
-@dataclass
+# Since it is immutable, it can be added to sets and used as keys in dictionaries (e.g. in a transposition table)
+# Its hash is the Zobrist hash of the state (see DungeonZobrist) which is stored in the state
+# since it is computed incrementally by "get_successor".
+@dataclass(frozen=True)
 class DungeonState:
+    __slots__ = ("time", "turn", "layout", "player", "coins", "daggers", "keys", "monsters", "zobrist")
     time: int
     turn: int
     layout: DungeonLayout
     player: Player
-    coins: Set[Point]
-    daggers: Set[Point]
-    keys: Set[Point]
-    monsters: List[Monster]
+    coins: FrozenSet[Point]
+    daggers: FrozenSet[Point]
+    keys: FrozenSet[Point]
+    monsters: Tuple[Monster, ...]
+    zobrist: int
+
+    def __hash__(self) -> int:
+        return self.zobrist
 
     # return the next turn (it ignore all the dead monsters)
     def next_turn(self) -> int:
-        turn = self.turn
-        while turn < len(self.monsters):
-            if self.monsters[turn].alive:
-                return turn+1
-            turn += 1
-        return 0
+        return next_turn(self.turn, self.monsters)
     
     # The score is 1 point for each coin, 10 points for each monster, -0.1 points for each passing second.
     def score(self) -> int:
@@ -102,6 +224,14 @@ class DungeonState:
         header = f"Inventory: {self.player.inventory.keys} Key(s), {self.player.inventory.daggers} Dagger(s), {self.player.inventory.coins} Coin(s)\n"
         return header + '\n'.join(''.join(position_to_str(Point(x, y)) for x in range(self.layout.width)) for y in range(self.layout.height))
 
+# return the turn that follows the given turn (it ignore all the dead monsters)
+def next_turn(turn: int, monsters: Tuple[Monster, ...]) -> int:
+    while turn < len(monsters):
+        if monsters[turn].alive:
+            return turn+1
+        turn += 1
+    return 0
+
 # This is the implementation of the dungeon game
 class DungeonGame(Game[DungeonState, Direction]):
     # The problem will contain the dungeon layout and the inital state
@@ -152,56 +282,95 @@ class DungeonGame(Game[DungeonState, Direction]):
             # prevent the monster from getting into a wall or another monster
             return [direction for direction, position in positions if position in state.layout.walkable and position not in monster_locations]
 
+    # The successor only creates the parts of the state that are changed by the action, and shares the rest with the state
+    # The hash of the successor is updated by XORing the Zobrist keys of the changed parts
     def get_successor(self, state: DungeonState, action: Direction) -> DungeonState:
-        state = deepcopy(state)
+        zobrist = state.layout.zobrist
+        width = zobrist.width
+        key = state.zobrist
+        player, monsters = state.player, state.monsters
+        coins, daggers, keys = state.coins, state.daggers, state.keys
         current_turn = state.turn
         if current_turn == 0:
             # This action is done by the player
-            new_position = state.player.position + action.to_vector()
-            state.player.position = new_position
-            if new_position in state.coins:
+            new_position = player.position + action.to_vector()
+            cell = new_position.y * width + new_position.x
+            key ^= zobrist.player[player.position.y * width + player.position.x] ^ zobrist.player[cell]
+            inventory = player.inventory
+            dagger_count, coin_count, key_count = inventory.daggers, inventory.coins, inventory.keys
+            if new_position in coins:
                 # If we walk over a coin, we take it
-                state.coins.remove(new_position)
-                state.player.inventory.coins += 1
-            if new_position in state.daggers:
+                coins = coins - {new_position}
+                key ^= zobrist.coins[cell]
+                coin_count += 1
+            if new_position in daggers:
                 # If we walk over a dagger, we take it
-                state.daggers.remove(new_position)
-                state.player.inventory.daggers += 1
-            if new_position in state.keys:
+                daggers = daggers - {new_position}
+                key ^= zobrist.daggers[cell]
+                dagger_count += 1
+            if new_position in keys:
                 # If we walk over a dagger, we take it
-                state.keys.remove(new_position)
-                state.player.inventory.keys += 1
+                keys = keys - {new_position}
+                key ^= zobrist.keys[cell]
+                key_count += 1
+            alive = True
             # Find the monsters at the player position
-            monsters_at_player = [monster for monster in state.monsters if monster.position == new_position and monster.alive]
+            monsters_at_player = [index for index, monster in enumerate(monsters) if monster.position == new_position and monster.alive]
             if monsters_at_player:
-                if state.player.inventory.daggers < len(monsters_at_player):
+                if dagger_count < len(monsters_at_player):
                     # If we encounter a monster and we don't have a dagger, we die
-                    state.player.inventory.daggers = 0
-                    state.player.alive = False
+                    dagger_count = 0
+                    alive = False
+                    key ^= zobrist.player_dead
                 else:
                     # If we encounter a monster and we have a dagger, we kill it
-                    state.player.inventory.daggers -= len(monsters_at_player)
-                    for monster in monsters_at_player:
-                        monster.alive = False
+                    dagger_count -= len(monsters_at_player)
+                    monsters = tuple(
+                        Monster(monster.position, False) if index in monsters_at_player else monster
+                        for index, monster in enumerate(monsters)
+                    )
+                    for index in monsters_at_player:
+                        key ^= zobrist.monster_dead[index]
+            if dagger_count != inventory.daggers:
+                key ^= zobrist.counter("daggers", inventory.daggers) ^ zobrist.counter("daggers", dagger_count)
+            if coin_count != inventory.coins:
+                key ^= zobrist.counter("coins", inventory.coins) ^ zobrist.counter("coins", coin_count)
+            if key_count != inventory.keys:
+                key ^= zobrist.counter("keys", inventory.keys) ^ zobrist.counter("keys", key_count)
+            if (dagger_count, coin_count, key_count) != (inventory.daggers, inventory.coins, inventory.keys):
+                inventory = Player.Inventory(dagger_count, coin_count, key_count)
+            player = Player(new_position, alive, inventory)
         else:
             # This action is done by a monster
-            monster = state.monsters[current_turn - 1]
+            index = current_turn - 1
+            monster = monsters[index]
             new_position = monster.position + action.to_vector()
-            monster.position = new_position
-            if new_position == state.player.position:
-                if state.player.inventory.daggers != 0:
+            monster_keys = zobrist.monsters[index]
+            key ^= monster_keys[monster.position.y * width + monster.position.x] ^ monster_keys[new_position.y * width + new_position.x]
+            alive = True
+            if new_position == player.position:
+                inventory = player.inventory
+                if inventory.daggers != 0:
                     # If we encounter a player and they have a dagger, we die
-                    monster.alive = False
-                    state.player.inventory.daggers -= 1
+                    alive = False
+                    key ^= zobrist.monster_dead[index]
+                    key ^= zobrist.counter("daggers", inventory.daggers) ^ zobrist.counter("daggers", inventory.daggers - 1)
+                    player = Player(player.position, player.alive, Player.Inventory(inventory.daggers - 1, inventory.coins, inventory.keys))
                 else:
                     # If we encounter a player and they don't have a dagger, we eat them
-                    state.player.alive = False
+                    key ^= zobrist.player_dead
+                    player = Player(player.position, False, inventory)
+            if new_position != monster.position or not alive:
+                monsters = monsters[:index] + (Monster(new_position, alive),) + monsters[index+1:]
         # Advance the turn
-        state.turn = state.next_turn()
-        if state.turn == 0:
-            # if the new turn is 0 (the player's turn), we advance the clock 
-            state.time += 1
-        return state
+        turn = next_turn(current_turn, monsters)
+        key ^= zobrist.turns[current_turn] ^ zobrist.turns[turn]
+        # if the new turn is 0 (the player's turn), we advance the clock 
+        time = state.time
+        if turn == 0:
+            key ^= zobrist.counter("time", time) ^ zobrist.counter("time", time + 1)
+            time += 1
+        return DungeonState(time, turn, state.layout, player, coins, daggers, keys, monsters, key)
 
     # Read a dungeon problem from text containing a grid of tiles
     @staticmethod
@@ -229,9 +398,12 @@ class DungeonGame(Game[DungeonState, Direction]):
                     elif char == DungeonTile.EXIT:
                         exit = Point(x, y)
         problem = DungeonGame()
-        problem.layout = DungeonLayout(width, height, walkable, exit)
+        problem.layout = DungeonLayout(width, height, walkable, exit, DungeonZobrist(width, height, walkable, len(monsters)),
+                                      DistanceFields(width, height, walkable))
         player = Player(player, True, Player.Inventory(0, 0, 0))
-        problem.initial_state = DungeonState(0, 0, problem.layout, player, coins, daggers, keys, monsters)
+        state = DungeonState(0, 0, problem.layout, player, frozenset(coins), frozenset(daggers), frozenset(keys), tuple(monsters), 0)
+        problem.initial_state = DungeonState(0, 0, problem.layout, player, state.coins, state.daggers, state.keys, state.monsters,
+                                             problem.layout.zobrist(state))
         return problem
 
     # Read a dungeon problem from file containing a grid of tiles
@@ -276,50 +448,30 @@ class MonsterAgent(Agent):
 # The Heuristic Function #
 ##########################
 
-# Return the path length or a very large number if the path is None
-def path_length(path) -> int:
-    return 0xffffffff if path is None else len(path)-1
-
-# Return the path between two points in the dungeom
-# The result is cached inside the game object
-def compute_path(game: DungeonGame, p1: Point, p2: Point) -> List[Point]:
-    cache = game.cache()
-    if p1 not in cache:
-        from collections import deque
-        path_map = {p1: [p1]}
-        queue = deque([p1])
-        while queue:
-            parent = queue.popleft()
-            path = path_map[parent]
-            for direction in Direction:
-                child = parent + direction.to_vector()
-                if child in path_map or child not in game.layout.walkable:
-                    continue
-                path_map[child] = path + [child]
-                queue.append(child)
-        cache[p1] = path_map
-    return cache[p1].get(p2, None)
-
-# Finds the shortest path from a point to a path in the dungeon
-def path_to_path(game: DungeonGame, p1: Point, path: List[Point]):
-    if path is None: return None
-    paths = [compute_path(game, p1, p2) for p2 in path]
-    _, _, shortest = min((path_length(path), index, path) for index, path in enumerate(paths))
-    return shortest
-
 # Checks if monsters can reach the player while traversing the shortest path to a goal point
 # Returns the number of monster that endanger the player and the length of the player's path
+# The player's path is traversed backwards (from the goal) using the predecessors, so no path is created
 def path_safety(game: DungeonGame, state: DungeonState, goal: Point):
-    path = compute_path(game, state.player.position, goal)
-    length = path_length(path)
-    # For each alive monster, find the shortest path from the the monster to the player's path
-    monster_paths = [path_to_path(game, monster.position, path) for monster in state.monsters if monster.alive]
-    # Find how long the monster will take to reach the player's path
-    monster_path_lengths = [path_length(monster_path) for monster_path in monster_paths]
-    # Find how it will take the player to get past the monster encounter position
-    monster_encounter_distance = [path.index(monster_path[-1]) for monster_path in monster_paths]
-    # Count dangerous monsters (the ones that can reach the player path before the player can outpace them)
-    danger = sum(encounter >= distance for encounter, distance in zip(monster_encounter_distance, monster_path_lengths))
+    fields = state.layout.distances
+    player, goal = fields.index(state.player.position), fields.index(goal)
+    length = fields.field(player)[goal]
+    if length == DistanceFields.UNREACHABLE: return 0, length
+    predecessors = fields.predecessors[player]
+    danger = 0
+    for monster in state.monsters:
+        if not monster.alive: continue
+        monster_distances = fields.field(fields.index(monster.position))
+        # Find the nearest cell on the player's path to the monster (the earliest cell on the path if there is a tie)
+        # where "encounter" is the index of the cell on the player's path and "distance" is the monster's distance to it
+        cell, index = goal, length
+        distance, encounter = DistanceFields.UNREACHABLE, 0
+        while True:
+            if monster_distances[cell] <= distance:
+                distance, encounter = monster_distances[cell], index
+            if index == 0: break
+            cell, index = predecessors[cell], index - 1
+        # The monster is dangerous if it can reach the player path before the player can outpace it
+        if encounter >= distance: danger += 1
     return danger, length
 
 # Returns a heuristic value for the dungeon game state
@@ -352,7 +504,7 @@ def dungeon_heuristic(game: DungeonGame, state: DungeonState, agent: int) -> flo
 
     # find the distance to the nearest monster
     if alive_monsters:
-        nearest_monster = min(path_length(compute_path(game, state.player.position, monster.position)) for monster in alive_monsters)
+        nearest_monster = min(state.layout.distances.distance(state.player.position, monster.position) for monster in alive_monsters)
     else:
         nearest_monster = area
     
@@ -1,6 +1,7 @@
 from dungeon import DungeonGame, Direction, DungeonState, DungeonTile, MonsterAgent
 from agents import HumanAgent, SearchAgent, RandomAgent
 from helpers.utils import fetch_tracked_call_count
+from functools import partial
 import argparse, time
 
 def colored_dungeon(level: str):
@@ -26,9 +27,17 @@ def get_heuristic(name: str):
     print(f"Requested Heuristic '{name}' is invalid")
     exit(-1)
 
+# If desired by the user, the search function reuses the values of the repeated states using a transposition table
+# The same table is used for all the moves since the stored values remain valid
+def with_table(search_fn, args: argparse.Namespace):
+    if args.table_size <= 0: return search_fn
+    from transposition import TranspositionTable
+    return partial(search_fn, table=TranspositionTable(args.table_size))
+
 # Create an agent based on the user selections
 def create_agent(args: argparse.Namespace):
     agent_type: str = args.agent
+    depth = 5 if args.depth is None else args.depth
     if agent_type == "human":
         # This function reads the action from the user (human)
         def dungeon_user_action(problem: DungeonGame, state: DungeonState) -> Direction:
@@ -56,19 +65,24 @@ def create_agent(args: argparse.Namespace):
     if agent_type == "minimax":
         from search import minimax
         heuristic = get_heuristic(args.heuristic)
-        return SearchAgent(minimax, heuristic, args.depth)
+        return SearchAgent(with_table(minimax, args), heuristic, depth)
     if agent_type == "alphabeta":
         from search import alphabeta
         heuristic = get_heuristic(args.heuristic)
-        return SearchAgent(alphabeta, heuristic, args.depth)
+        return SearchAgent(with_table(alphabeta, args), heuristic, depth)
     if agent_type == "alphabeta_order":
         from search import alphabeta_with_move_ordering
         heuristic = get_heuristic(args.heuristic)
-        return SearchAgent(alphabeta_with_move_ordering, heuristic, args.depth)
+        return SearchAgent(with_table(alphabeta_with_move_ordering, args), heuristic, depth)
+    if agent_type == "alphabeta_id":
+        from search import iterative_deepening_alphabeta
+        heuristic = get_heuristic(args.heuristic)
+        # The depth only limits the iterative deepening if it is given by the user
+        return SearchAgent(iterative_deepening_alphabeta, heuristic, -1 if args.depth is None else args.depth, args.time_budget)
     if agent_type == "expectimax":
         from search import expectimax
         heuristic = get_heuristic(args.heuristic)
-        return SearchAgent(expectimax, heuristic, args.depth)
+        return SearchAgent(with_table(expectimax, args), heuristic, depth)
     print(f"Requested Agent '{agent_type}' is invalid")
     exit(-1)
 
@@ -116,6 +130,9 @@ def main(args: argparse.Namespace):
         # Get the number of explored nodes, if the current agent is a search agent
         if isinstance(agent, SearchAgent):
             print("Explored Nodes:", fetch_tracked_call_count(DungeonGame.is_terminal))
+            if args.agent == "alphabeta_id":
+                from search import fetch_iterative_deepening_stats
+                print("Completed Depth:", fetch_iterative_deepening_stats()["depths"][-1])
         
         # Apply the action to the state
         state = game.get_successor(state, action)
@@ -133,12 +150,17 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Play Dungeon as Human or AI")
     parser.add_argument("level", help="path to the dungeon to play")
     parser.add_argument("--agent", "-a", default="human",
-                        choices=['human', 'greedy', 'random', 'minimax', 'alphabeta', 'alphabeta_order', 'expectimax'],
+                        choices=['human', 'greedy', 'random', 'minimax', 'alphabeta', 'alphabeta_order', 'alphabeta_id', 'expectimax'],
                         help="the agent that will play the game")
     parser.add_argument("--heuristic", '-hf', default="zero",
                         choices=["zero", "heuristic"],
                         help="choose the heuristic to use")
-    parser.add_argument("--depth", "-d", type=int, default=5, help="How deep the algorithms should search")
+    parser.add_argument("--depth", "-d", type=int, default=None,
+                        help="How deep the algorithms should search (default: 5, or no limit for alphabeta_id)")
+    parser.add_argument("--time-budget", "-tb", type=float, default=1.0,
+                        help="How much time (seconds) the iterative deepening agent (alphabeta_id) can search for each move")
+    parser.add_argument("--table-size", "-ts", type=int, default=0,
+                        help="the number of slots in the transposition table (0 disables the table)")
     parser.add_argument("--ansicolors", "-ac", action="store_true",
                         help="Print the dungeon on the console with ANSI colors (only works on some terminals)")
     parser.add_argument("--sleep", "-s", type=float, default=0, help="How much time (seconds) to wait between actions")
@@ -1,15 +1,39 @@
-from typing import Tuple
+from typing import List, Tuple
 from game import HeuristicFunction, Game, S, A
 from helpers.utils import NotImplemented
+from transposition import TranspositionTable, EXACT, LOWER, UPPER, bound_type
 
 
 # TODO: Import any modules you want to use
+import functools, time
 
 # All search functions take a problem, a state, a heuristic function and the maximum search depth.
 # If the maximum search depth is -1, then there should be no depth cutoff (The expansion should not stop before reaching a terminal state) 
 
 # All the search functions should return the expected tree value and the best action to take based on the search results
 
+# All the search functions (except greedy) can be given a transposition table (see transposition.py) to reuse the values of
+# the states that are reached through different move orders. It is not used by default since it changes the explored nodes.
+
+# This function wraps a recursive search function so that it looks up the state in the transposition table before searching it
+# and stores the result after searching it. The window (alpha and beta) is only passed by the alpha beta search functions
+# and it is used to decide whether a stored bound is enough and whether the new result is exact or a bound.
+# The recursive search function must pass the table to its recursive calls, and it must recurse into the wrapped function
+# only if it was given a table (so a search without a table runs exactly as if there was no table support).
+def with_transposition_table(search_fn):
+    @functools.wraps(search_fn)
+    def search(game: Game[S, A], state: S, heuristic: HeuristicFunction, max_depth: int = -1, *window: float,
+               table: TranspositionTable = None) -> Tuple[float, A]:
+        alpha, beta = window or (float('-inf'), float('inf'))
+        entry = table.lookup(state, max_depth)
+        if entry is not None:
+            if entry.bound == EXACT or (entry.bound == LOWER and entry.value >= beta) or (entry.bound == UPPER and entry.value <= alpha):
+                return entry.value, entry.action
+        value, action = search_fn(game, state, heuristic, max_depth, *window, table=table)
+        table.store(state, max_depth, value, bound_type(value, alpha, beta) if window else EXACT, action)
+        return value, action
+    return search
+
 # This is a simple search function that looks 1-step ahead and returns the action that lead to highest heuristic value.
 # This algorithm is bad if the heuristic function is weak. That is why we use minimax search to look ahead for many steps.
 def greedy(game: Game[S, A], state: S, heuristic: HeuristicFunction, max_depth: int = -1) -> Tuple[float, A]:
@@ -30,8 +54,10 @@ def greedy(game: Game[S, A], state: S, heuristic: HeuristicFunction, max_depth:
 # and if it is > 0, it should be a min node. Also remember that game.is_terminal(s), returns the values
 # for all the agents. So to get the value for the player (which acts at the max nodes), you need to
 # get values[0].
-def minimax(game: Game[S, A], state: S, heuristic: HeuristicFunction, max_depth: int = -1) -> Tuple[float, A]:
+def minimax(game: Game[S, A], state: S, heuristic: HeuristicFunction, max_depth: int = -1,
+            table: TranspositionTable = None) -> Tuple[float, A]:
     # TODO: Complete this function
+    search = minimax if table is None else minimax_with_table
     is_terminal_state = game.is_terminal(state)
     if max_depth == 0:
         return heuristic(game, state, 0), None
@@ -40,7 +66,7 @@ def minimax(game: Game[S, A], state: S, heuristic: HeuristicFunction, max_depth:
             return is_terminal_state[1][0], None
         result_value, result_action = float('-inf'), None
         for action in game.get_actions(state):
-            value = minimax(game, game.get_successor(state, action), heuristic, max_depth - 1)[0]
+            value = search(game, game.get_successor(state, action), heuristic, max_depth - 1, table=table)[0]
             if value > result_value:
                 result_value, result_action = value, action
         return result_value, result_action
@@ -49,14 +75,17 @@ def minimax(game: Game[S, A], state: S, heuristic: HeuristicFunction, max_depth:
             return is_terminal_state[1][0], None
         result_value, result_action = float('inf'), None
         for action in game.get_actions(state):
-            value = minimax(game, game.get_successor(state, action), heuristic, max_depth - 1)[0]
+            value = search(game, game.get_successor(state, action), heuristic, max_depth - 1, table=table)[0]
             if value < result_value:
                 result_value, result_action = value, action
         return result_value, result_action
 
+minimax_with_table = with_transposition_table(minimax)
+
 
 def alphabeta_recursive(game: Game[S, A], state: S, heuristic: HeuristicFunction, max_depth: int = -1, alpha: float = float('-inf'),
-                        beta: float = float('inf')) -> Tuple[float, A]:
+                        beta: float = float('inf'), table: TranspositionTable = None) -> Tuple[float, A]:
+    search = alphabeta_recursive if table is None else alphabeta_recursive_with_table
     is_terminal_state = game.is_terminal(state)
     if max_depth == 0:
         return heuristic(game, state, 0), None
@@ -65,7 +94,7 @@ def alphabeta_recursive(game: Game[S, A], state: S, heuristic: HeuristicFunction
             return is_terminal_state[1][0], None
         result_value, result_action = float('-inf'), None
         for action in game.get_actions(state):
-            value = alphabeta_recursive(game, game.get_successor(state, action), heuristic, max_depth - 1, alpha, beta)[0]
+            value = search(game, game.get_successor(state, action), heuristic, max_depth - 1, alpha, beta, table=table)[0]
             if value >= beta:
                 return value, action
             if value > result_value:
@@ -77,7 +106,7 @@ def alphabeta_recursive(game: Game[S, A], state: S, heuristic: HeuristicFunction
             return is_terminal_state[1][0], None
         result_value, result_action = float('inf'), None
         for action in game.get_actions(state):
-            value = alphabeta_recursive(game, game.get_successor(state, action), heuristic, max_depth - 1, alpha, beta)[0]
+            value = search(game, game.get_successor(state, action), heuristic, max_depth - 1, alpha, beta, table=table)[0]
             if value <= alpha:
                 return value, action
             if value < result_value:
@@ -85,17 +114,21 @@ def alphabeta_recursive(game: Game[S, A], state: S, heuristic: HeuristicFunction
             beta = min(beta, result_value)
         return result_value, result_action
 
+alphabeta_recursive_with_table = with_transposition_table(alphabeta_recursive)
+
 
 # Apply Alpha Beta pruning and return the tree value and the best action
 # Hint: Read the hint for minimax.
-def alphabeta(game: Game[S, A], state: S, heuristic: HeuristicFunction, max_depth: int = -1) -> Tuple[float, A]:
+def alphabeta(game: Game[S, A], state: S, heuristic: HeuristicFunction, max_depth: int = -1,
+              table: TranspositionTable = None) -> Tuple[float, A]:
     # TODO: Complete this function
-    return alphabeta_recursive(game, state, heuristic, max_depth)
+    return alphabeta_recursive(game, state, heuristic, max_depth, table=table)
 
 
 def alphabeta_with_move_ordering_recursive(game: Game[S, A], state: S, heuristic: HeuristicFunction, max_depth: int = -1,
                                            alpha: float = float('-inf'),
-                                           beta: float = float('inf')) -> Tuple[float, A]:
+                                           beta: float = float('inf'), table: TranspositionTable = None) -> Tuple[float, A]:
+    search = alphabeta_with_move_ordering_recursive if table is None else alphabeta_with_move_ordering_recursive_with_table
     is_terminal_state = game.is_terminal(state)
     if max_depth == 0:
         return heuristic(game, state, 0), None
@@ -106,7 +139,7 @@ def alphabeta_with_move_ordering_recursive(game: Game[S, A], state: S, heuristic
         heuristic_values = [(heuristic(game, game.get_successor(state, action), 0), action) for action in game.get_actions(state)]
         heuristic_values.sort(key=lambda x: x[0], reverse=True)
         for heuristic_value, action in heuristic_values:
-            value = alphabeta_with_move_ordering_recursive(game, game.get_successor(state, action), heuristic, max_depth - 1, alpha, beta)[0]
+            value = search(game, game.get_successor(state, action), heuristic, max_depth - 1, alpha, beta, table=table)[0]
             if value >= beta:
                 return value, action
             if value > result_value:
@@ -120,7 +153,7 @@ def alphabeta_with_move_ordering_recursive(game: Game[S, A], state: S, heuristic
         heuristic_values = [(heuristic(game, game.get_successor(state, action), 0), action) for action in game.get_actions(state)]
         heuristic_values.sort(key=lambda x: x[0])
         for heuristic_value, action in heuristic_values:
-            value = alphabeta_with_move_ordering_recursive(game, game.get_successor(state, action), heuristic, max_depth - 1, alpha, beta)[0]
+            value = search(game, game.get_successor(state, action), heuristic, max_depth - 1, alpha, beta, table=table)[0]
             if value <= alpha:
                 return value, action
             if value < result_value:
@@ -128,15 +161,20 @@ def alphabeta_with_move_ordering_recursive(game: Game[S, A], state: S, heuristic
             beta = min(beta, result_value)
         return result_value, result_action
 
+alphabeta_with_move_ordering_recursive_with_table = with_transposition_table(alphabeta_with_move_ordering_recursive)
+
 
 # Apply Alpha Beta pruning with move ordering and return the tree value and the best action
 # Hint: Read the hint for minimax.
-def alphabeta_with_move_ordering(game: Game[S, A], state: S, heuristic: HeuristicFunction, max_depth: int = -1) -> Tuple[float, A]:
+def alphabeta_with_move_ordering(game: Game[S, A], state: S, heuristic: HeuristicFunction, max_depth: int = -1,
+                                 table: TranspositionTable = None) -> Tuple[float, A]:
     # TODO: Complete this function
-    return alphabeta_with_move_ordering_recursive(game, state, heuristic, max_depth)
+    return alphabeta_with_move_ordering_recursive(game, state, heuristic, max_depth, table=table)
 
 
-def expectimax_recursive(game: Game[S, A], state: S, heuristic: HeuristicFunction, max_depth: int = -1) -> Tuple[float, A]:
+def expectimax_recursive(game: Game[S, A], state: S, heuristic: HeuristicFunction, max_depth: int = -1,
+                         table: TranspositionTable = None) -> Tuple[float, A]:
+    search = expectimax_recursive if table is None else expectimax_recursive_with_table
     is_terminal_state = game.is_terminal(state)
     if max_depth == 0:
         return heuristic(game, state, 0), None
@@ -145,7 +183,7 @@ def expectimax_recursive(game: Game[S, A], state: S, heuristic: HeuristicFunctio
             return is_terminal_state[1][0], None
         result_value, result_action = float('-inf'), None
         for action in game.get_actions(state):
-            value = expectimax_recursive(game, game.get_successor(state, action), heuristic, max_depth - 1)[0]
+            value = search(game, game.get_successor(state, action), heuristic, max_depth - 1, table=table)[0]
             if value > result_value:
                 result_value, result_action = value, action
         return result_value, result_action
@@ -154,15 +192,91 @@ def expectimax_recursive(game: Game[S, A], state: S, heuristic: HeuristicFunctio
             return is_terminal_state[1][0], None
         result_value, result_action = 0, None
         for action in game.get_actions(state):
-            value = expectimax_recursive(game, game.get_successor(state, action), heuristic, max_depth - 1)[0]
+            value = search(game, game.get_successor(state, action), heuristic, max_depth - 1, table=table)[0]
             result_value += value
         result_value /= len(game.get_actions(state))
         return result_value, result_action
 
+expectimax_recursive_with_table = with_transposition_table(expectimax_recursive)
+
 
 # Apply Expectimax search and return the tree value and the best action
 # Hint: Read the hint for minimax, but note that the monsters (turn > 0) do not act as min nodes anymore,
 # they now act as chance nodes (they act randomly).
-def expectimax(game: Game[S, A], state: S, heuristic: HeuristicFunction, max_depth: int = -1) -> Tuple[float, A]:
+def expectimax(game: Game[S, A], state: S, heuristic: HeuristicFunction, max_depth: int = -1,
+               table: TranspositionTable = None) -> Tuple[float, A]:
     # TODO: Complete this function
-    return expectimax_recursive(game, state, heuristic, max_depth)
+    return expectimax_recursive(game, state, heuristic, max_depth, table=table)
+
+
+# This is raised inside the iterative deepening search when the time budget runs out
+class SearchTimeout(Exception):
+    pass
+
+# Stores the depth of the last completed iteration of every iterative deepening search since the last fetch
+iterative_deepening_stats = {"depths": []}
+
+def fetch_iterative_deepening_stats():
+    stats = dict(iterative_deepening_stats)
+    iterative_deepening_stats["depths"] = []
+    return stats
+
+# Apply iterative deepening Alpha Beta pruning under a time budget (in seconds) and return the tree value and the best action
+# It searches to depth 1, 2, 3, ... until the time budget runs out (or max_depth is reached, or the whole tree is searched)
+# and returns the result of the deepest completed iteration (the first iteration always completes).
+# The principal variation (the sequence of best actions) found by each iteration is searched first by the next iteration,
+# so the next iteration usually finds a good alpha or beta early and prunes more nodes.
+def iterative_deepening_alphabeta(game: Game[S, A], state: S, heuristic: HeuristicFunction, max_depth: int = -1,
+                                  time_budget: float = 1.0) -> Tuple[float, A]:
+    deadline = time.perf_counter() + time_budget
+    result: Tuple[float, A] = None
+    cutoff = False # Whether the current iteration stopped at the depth limit anywhere (otherwise, deeper searches are the same)
+
+    # Returns the value of the state and the principal variation below it
+    # "pv" is the principal variation from the previous iteration if the state is on it (otherwise, it is empty)
+    def search(state: S, depth: int, alpha: float, beta: float, pv: List[A]) -> Tuple[float, List[A]]:
+        nonlocal cutoff
+        if result is not None and time.perf_counter() > deadline:
+            raise SearchTimeout()
+        is_terminal_state = game.is_terminal(state)
+        if depth == 0:
+            cutoff = True
+            return heuristic(game, state, 0), []
+        if is_terminal_state[0]:
+            return is_terminal_state[1][0], []
+        actions = game.get_actions(state)
+        if pv and pv[0] in actions:
+            actions = [pv[0], *(action for action in actions if action != pv[0])]
+        else:
+            pv = []
+        maximize = game.get_turn(state) == 0
+        result_value, result_line = float('-inf') if maximize else float('inf'), []
+        for index, action in enumerate(actions):
+            value, line = search(game.get_successor(state, action), depth - 1, alpha, beta, pv[1:] if index == 0 else [])
+            if maximize:
+                if value > result_value:
+                    result_value, result_line = value, [action, *line]
+                if value >= beta: break
+                alpha = max(alpha, result_value)
+            else:
+                if value < result_value:
+                    result_value, result_line = value, [action, *line]
+                if value <= alpha: break
+                beta = min(beta, result_value)
+        return result_value, result_line
+
+    if max_depth == 0:
+        return heuristic(game, state, 0), None
+    pv: List[A] = []
+    depth = 0
+    while max_depth < 0 or depth < max_depth:
+        cutoff = False
+        try:
+            value, line = search(state, depth + 1, float('-inf'), float('inf'), pv)
+        except SearchTimeout:
+            break
+        depth += 1
+        result, pv = (value, line[0] if line else None), line
+        if not cutoff: break
+    iterative_deepening_stats["depths"].append(depth)
+    return result
@@ -0,0 +1,116 @@
+from typing import Any, Callable, Dict, Hashable, List, Optional
+import argparse
+
+from game import A, S
+
+# This file contains a transposition table for the game tree search functions (see search.py).
+# The same game state can be reached through different move orders, so the search functions store the value
+# of every searched state in the table and reuse it when the state is reached again.
+# Each entry stores:
+# 1. The value of the state and the best action found for it.
+# 2. The depth to which the state was searched (-1 means that it was searched till the terminal states).
+#    An entry is only used by a search that needs the same depth or less.
+# 3. The bound type: the value is EXACT, or it is a LOWER bound (the search was cut off at a max node since
+#    the value was at least beta) or an UPPER bound (the search was cut off at a min node since the value was at most alpha).
+# The table has a fixed number of slots, and every state is mapped to a slot by its hash. When two states map
+# to the same slot (or when the same state is searched again), the deeper search is kept
+# (a new entry replaces the old one if its depth is greater than or equal).
+# The states must be hashable, or a key function that maps each state to a hashable key must be given.
+
+# The types of the stored values
+EXACT, LOWER, UPPER = 0, 1, 2
+
+class TranspositionEntry:
+    __slots__ = ("key", "value", "depth", "bound", "action")
+
+    def __init__(self, key: Hashable, value: float, depth: int, bound: int, action: Any) -> None:
+        self.key = key
+        self.value = value
+        self.depth = depth
+        self.bound = bound
+        self.action = action
+
+# Returns True if a search to depth "searched" covers a search to depth "required" (where -1 means no depth cutoff)
+def covers(searched: int, required: int) -> bool:
+    if searched < 0: return True
+    return 0 <= required <= searched
+
+class TranspositionTable:
+    def __init__(self, size: int = 2**16, key: Optional[Callable[[S], Hashable]] = None) -> None:
+        self.size = size
+        self.key = key
+        self.slots: List[Optional[TranspositionEntry]] = [None] * size
+        self.hits = self.misses = self.stores = self.rejected = 0
+
+    # Returns the entry of the state if it was searched to the given depth or deeper (otherwise, it returns None)
+    def lookup(self, state: S, depth: int) -> Optional[TranspositionEntry]:
+        key = state if self.key is None else self.key(state)
+        entry = self.slots[hash(key) % self.size]
+        if entry is not None and entry.key == key and covers(entry.depth, depth):
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    # Stores the search result of the state unless its slot contains a deeper search result
+    def store(self, state: S, depth: int, value: float, bound: int, action: A = None) -> None:
+        key = state if self.key is None else self.key(state)
+        index = hash(key) % self.size
+        entry = self.slots[index]
+        if entry is not None and not covers(depth, entry.depth):
+            self.rejected += 1
+            return
+        self.slots[index] = TranspositionEntry(key, value, depth, bound, action)
+        self.stores += 1
+
+    def clear(self) -> None:
+        self.slots = [None] * self.size
+
+    def __len__(self) -> int:
+        return sum(entry is not None for entry in self.slots)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "rejected": self.rejected,
+            "size": len(self),
+            "maxsize": self.size
+        }
+
+# Returns the bound type of a value returned by a search that was called with the given alpha and beta
+def bound_type(value: float, alpha: float, beta: float) -> int:
+    if value <= alpha: return UPPER
+    if value >= beta: return LOWER
+    return EXACT
+
+def main(args: argparse.Namespace):
+    from dungeon import DungeonGame, dungeon_heuristic
+    from helpers.utils import fetch_tracked_call_count
+    import search, time
+    print(f"{'Dungeon':<24} {'Search':<30} {'Nodes':>9} {'Nodes (TT)':>11} {'Time (s)':>9} {'Time TT (s)':>12}")
+    for path in args.dungeons:
+        for name in args.search:
+            search_fn = getattr(search, name)
+            game = DungeonGame.from_file(path)
+            state = game.get_initial_state()
+            results = []
+            for table in (None, TranspositionTable(args.table_size)):
+                fetch_tracked_call_count(DungeonGame.is_terminal)
+                start = time.perf_counter()
+                search_fn(game, state, dungeon_heuristic, args.depth, table=table)
+                results.append((fetch_tracked_call_count(DungeonGame.is_terminal), time.perf_counter() - start))
+            (nodes, elapsed), (table_nodes, table_elapsed) = results
+            print(f"{path:<24} {name:<30} {nodes:>9} {table_nodes:>11} {elapsed:>9.3f} {table_elapsed:>12.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the explored nodes of the game searches with and without a transposition table")
+    parser.add_argument("dungeons", nargs="+", help="paths to the dungeons")
+    parser.add_argument("--search", "-s", nargs="+", default=["minimax", "alphabeta", "alphabeta_with_move_ordering", "expectimax"],
+                        choices=["minimax", "alphabeta", "alphabeta_with_move_ordering", "expectimax"],
+                        help="the search functions to compare")
+    parser.add_argument("--depth", "-d", type=int, default=5, help="the search depth")
+    parser.add_argument("--table-size", "-ts", type=int, default=2**16, help="the number of slots in the transposition table")
+    args = parser.parse_args()
+    main(args)